@@ -0,0 +1,125 @@
+# Threaded camera reader shared by capture_image and the UI.
+# cap.read() on the main thread blocks on the driver, and while the main thread is busy (imshow, model inference)
+# the driver queues frames up, so the next read returns an old frame. CameraSource reads the camera on its own
+# thread and keeps only the newest frames in a ring buffer, so callers always get the most recent frame.
+
+import threading
+import time
+from collections import deque
+
+import cv2
+
+
+class CameraSource:
+    """
+    Reads a camera on a background thread.
+
+    Args:
+        src (int or str): Camera index or stream url passed to cv2.VideoCapture.
+        buffer_size (int): Number of most recent frames kept.
+
+    Attributes:
+        captured (int): Number of frames read from the camera.
+        last_timestamp (float): Capture time (seconds since the epoch) of the frame last returned by read().
+        dropped (int): Number of frames skipped because a newer frame was already available when the
+            caller asked for one, i.e. frames the caller was too slow to see.
+    """
+
+    def __init__(self, src=0, buffer_size=2):
+        self.cap = cv2.VideoCapture(src)
+        self.captured = 0
+        self.last_timestamp = None
+        self._delivered = 0
+        self._buffer = deque(maxlen=buffer_size)  # (frame id, capture time, frame)
+        self._last_read_id = -1
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    @property
+    def dropped(self):
+        with self._condition:
+            return self._last_read_id + 1 - self._delivered
+
+    @property
+    def running(self):
+        """Whether the capture thread is still reading, False once the camera stopped or release() was called."""
+        with self._condition:
+            return self._running
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        """Starts the capture thread, returns self so it can be chained with the constructor."""
+        if self._running or not self.cap.isOpened():
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while self._running:
+            ret, frame = self.cap.read()
+            timestamp = time.time()
+            with self._condition:
+                if not ret:
+                    self._running = False
+                    self._condition.notify_all()
+                    break
+
+                self._buffer.append((self.captured, timestamp, frame))
+                self.captured += 1
+                self._condition.notify_all()
+
+    def latest(self):
+        """
+        Returns the newest frame without waiting.
+
+        Returns:
+            tuple: (frame, capture time in seconds since the epoch), (None, None) if no frame was captured yet.
+        """
+        with self._condition:
+            if not self._buffer:
+                return None, None
+            frame_id, timestamp, frame = self._buffer[-1]
+            if frame_id > self._last_read_id:
+                self._last_read_id = frame_id
+                self._delivered += 1
+            return frame, timestamp
+
+    def read(self, timeout=1.0):
+        """
+        Returns the newest frame that was not returned before, like cv2.VideoCapture.read().
+
+        Args:
+            timeout (float): Seconds to wait for a new frame, 0 to return immediately.
+
+        Returns:
+            tuple: (ret, frame), ret is False if no new frame arrived in time or the camera stopped.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: not self._running or
+                                     (self._buffer and self._buffer[-1][0] > self._last_read_id), timeout)
+            if not self._buffer or self._buffer[-1][0] <= self._last_read_id:
+                return False, None
+            frame_id, self.last_timestamp, frame = self._buffer[-1]
+            self._last_read_id = frame_id
+            self._delivered += 1
+            return True, frame
+
+    def frames(self):
+        """Returns the buffered (capture time, frame) pairs, oldest first."""
+        with self._condition:
+            return [(timestamp, frame) for _, timestamp, frame in self._buffer]
+
+    def release(self):
+        """Stops the capture thread and releases the camera."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.cap.release()
+        if self.captured:
+            print(f"Camera: {self.captured} frames captured, {self.dropped} dropped")
@@ -3,6 +3,8 @@ import mediapipe as mp
 import os
 
 from gesture_mapping import gesture_mapping_vowels, gesture_mapping_consonants
+from Image_acquisition.frame_writer import FrameWriter
+from Image_acquisition.camera_source import CameraSource
 
 def capture_images(output_dir, save_images=True):
     """
@@ -19,8 +21,8 @@ def capture_images(output_dir, save_images=True):
     #
     # mp_drawing = mp.solutions.drawing_utils
 
-    # Open the webcam
-    cap = cv2.VideoCapture(0)
+    # Open the webcam, frames are read on a background thread so imshow never makes them stale
+    cap = CameraSource(0).start()
     if not cap.isOpened():
         print("Error: Could not open the webcam.")
         return
@@ -31,11 +33,14 @@ def capture_images(output_dir, save_images=True):
     os.makedirs(letter_dir, exist_ok=True)
 
     frame_count = 0
+    writer = FrameWriter(num_threads=1)  # keeps disk writes off the preview loop
     print("Press 's' to save an image, 'q' to quit, 'n' to move to next letter.")
 
     while cap.isOpened():
         ret, frame = cap.read()
         if not ret:
+            if cap.running:
+                continue  # slow frame (camera warm-up, USB stall), keep waiting like a blocking read
             print("Error: Could not read a frame from the webcam.")
             break
 
@@ -63,7 +68,7 @@ def capture_images(output_dir, save_images=True):
             break
         elif key == ord('s') and save_images:  # Save image
             image_path = os.path.join(letter_dir, f"{gesture_keys[count_letter]}_blue_frame_{frame_count:04d}.jpg")
-            cv2.imwrite(image_path, cv2.flip(frame, 1))
+            writer.submit(cv2.flip(frame, 1), image_path)
             print(f"Image saved: {image_path}")
             frame_count += 1
         elif key == ord('n'):  # Move to next gesture
@@ -79,6 +84,7 @@ def capture_images(output_dir, save_images=True):
 
     # Release resources
     cap.release()
+    writer.close()
     cv2.destroyAllWindows()
     # hands.close()
 
@@ -0,0 +1,224 @@
+# Automatic letter segmentation of combo videos, the batch alternative to pressing 'n' in combo_video_to_image.
+# A first pass over each video builds a per-frame motion signal. Signers hold every letter still for a moment and
+# move between letters, so the low motion stretches (holds) are the letters, in the order of the gesture mapping.
+# The holds are written to a segment file (reviewable, and replayable with combo_video_to_image.extract_segments)
+# and their frames are extracted into the per letter directories in a second, grab-only pass.
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from gesture_mapping import gesture_mapping_vowels, gesture_mapping_consonants
+from Image_acquisition.combo_video_to_image import save_segments, extract_segments
+from Image_acquisition.video_to_image import sample_frame_indices
+from Preprocessing.yolo_labels import hand_landmarks_array
+
+
+def motion_signal(video_path, analysis_rate=10, analysis_width=160, use_hands=False, hands_width=640):
+    """
+    Computes how much the signer moves over a video.
+
+    Args:
+        video_path (str): Path to the combo video.
+        analysis_rate (float): Number of frames analysed per second of video, the others are only grabbed.
+        analysis_width (int): Frames are shrunk to this width before comparing them.
+        use_hands (bool): Use the displacement of the MediaPipe hand landmarks instead of the difference between
+            frames. More robust to background motion and lighting changes, but slower. Frames without a hand
+            count as full motion (hands usually drop out of view between letters).
+        hands_width (int): With use_hands, frames wider than this are shrunk to it before hand detection. Much
+            larger than analysis_width, a hand on a thumbnail is a few pixels wide and is not found.
+
+    Returns:
+        tuple: (times, motion) arrays, the time in seconds of each analysed frame and its motion.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Error: Cannot open video {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if fps <= 0:
+        # Some containers and webcam recordings report no frame rate, the holds could not be placed in time
+        cap.release()
+        raise ValueError(f"Error: {video_path} reports no frame rate, re-encode it with a fixed frame rate")
+
+    hands = None
+    if use_hands:
+        import mediapipe as mp  # only needed for the landmark signal
+        hands = mp.solutions.hands.Hands(static_image_mode=False, max_num_hands=1,
+                                         min_detection_confidence=0.5, min_tracking_confidence=0.5)
+
+    frames_to_analyse = sample_frame_indices(fps, analysis_rate)
+    next_index = next(frames_to_analyse)
+    frame_index = 0
+    times = []
+    motion = []
+    previous = None
+    while cap.grab():
+        if frame_index == next_index:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            height, width = frame.shape[:2]
+
+            if hands is not None:
+                if width > hands_width:
+                    frame = cv2.resize(frame, (hands_width, max(1, round(height * hands_width / width))),
+                                       interpolation=cv2.INTER_AREA)
+                results = hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                landmarks = hand_landmarks_array(results.multi_hand_landmarks)
+                current = landmarks[0, :, :2] if len(landmarks) else None
+                if current is None or previous is None:
+                    value = 1.0
+                else:
+                    value = float(np.linalg.norm(current - previous, axis=1).mean())
+            else:
+                small = cv2.resize(frame, (analysis_width, max(1, round(height * analysis_width / width))),
+                                   interpolation=cv2.INTER_AREA)
+                current = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0).astype(np.float32)
+                value = float(np.abs(current - previous).mean()) / 255 if previous is not None else 0.0
+
+            times.append(frame_index / fps)
+            motion.append(value)
+            previous = current
+            next_index = next(frames_to_analyse)
+        frame_index += 1
+
+    cap.release()
+    if hands is not None:
+        hands.close()
+    return np.array(times), np.array(motion)
+
+
+def find_holds(times, motion, min_hold=0.5, smooth=0.5, threshold=None):
+    """
+    Finds the stretches of a video where the signer holds still.
+
+    Args:
+        times (numpy.ndarray): Time in seconds of each motion value.
+        motion (numpy.ndarray): Motion signal, see motion_signal.
+        min_hold (float): Shortest hold in seconds, shorter still stretches are transitions.
+        smooth (float): Width in seconds of the moving average applied to the motion first.
+        threshold (float): Motion under which the signer is still. If None, halfway between the typical still
+            level (10th percentile) and the typical moving level (90th percentile) of the smoothed motion.
+
+    Returns:
+        list: (start, end) times in seconds of the holds, in order.
+    """
+    if len(times) < 2:
+        return []
+
+    step = float(np.median(np.diff(times)))
+    # Never wider than the signal, np.convolve "same" would return more values than there are times
+    window = min(max(1, int(round(smooth / step))), len(motion))
+    smoothed = np.convolve(motion, np.ones(window) / window, mode="same")
+    if threshold is None:
+        low, high = np.percentile(smoothed, [10, 90])
+        threshold = float(low + (high - low) / 2)
+
+    still = smoothed < threshold
+    # Start and end positions of each run of still frames
+    edges = np.diff(np.concatenate(([0], still.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+
+    return [(float(times[start]), float(times[end])) for start, end in zip(starts, ends)
+            if times[end] - times[start] >= min_hold]
+
+
+def assign_letters(holds, gesture_keys):
+    """
+    Pairs holds with letters in order.
+
+    If there are more holds than letters, the longest ones are kept (spurious holds are usually short pauses
+    within a transition). If there are fewer, the last letters are left out and a warning is printed.
+
+    Args:
+        holds (list): (start, end) times of the holds, in order.
+        gesture_keys (list): Letters in the order they are signed.
+
+    Returns:
+        list: (letter, start, end) segments.
+    """
+    if len(holds) > len(gesture_keys):
+        longest = sorted(range(len(holds)), key=lambda i: holds[i][1] - holds[i][0], reverse=True)
+        holds = [holds[i] for i in sorted(longest[:len(gesture_keys)])]
+    elif len(holds) < len(gesture_keys):
+        print(f"Warning: found {len(holds)} holds for {len(gesture_keys)} letters, "
+              f"letters from '{gesture_keys[len(holds)]}' on are not assigned. Check the segment file.")
+
+    return [(letter, start, end) for letter, (start, end) in zip(gesture_keys, holds)]
+
+
+def segment_combo_video(video_path, output_dir, gesture_keys, segment_file, frame_rate=20, use_hands=False,
+                        min_hold=0.5, threshold=None):
+    """
+    Segments a combo video into letters and extracts the frames of each letter.
+
+    Args:
+        video_path (str): Path to the combo video.
+        output_dir (str): Directory the per letter directories are created in.
+        gesture_keys (list): Letters in the order they are signed.
+        segment_file (str): Where the found segments are written.
+        frame_rate (float): Number of frames to extract per second of hold.
+        use_hands (bool): Use the hand landmark signal, see motion_signal.
+        min_hold (float): Shortest hold in seconds, see find_holds.
+        threshold (float): Motion threshold, see find_holds.
+
+    Returns:
+        int: Number of frames saved.
+    """
+    start_time = time.perf_counter()
+    times, motion = motion_signal(video_path, use_hands=use_hands)
+    holds = find_holds(times, motion, min_hold=min_hold, threshold=threshold)
+    segments = assign_letters(holds, gesture_keys)
+    save_segments(segment_file, segments)
+    print(f"{video_path}: {len(segments)} letters found in {time.perf_counter() - start_time:.1f} seconds, "
+          f"segments written to {segment_file}")
+
+    return extract_segments(video_path, segment_file, output_dir, gesture_keys, frame_rate=frame_rate)
+
+
+def segment_combo_videos(jobs, workers=None, **segment_options):
+    """
+    Runs segment_combo_video over many videos on a process pool.
+
+    Args:
+        jobs (list): (video_path, output_dir, gesture_keys, segment_file) tuples.
+        workers (int): Number of worker processes, defaults to the number of cores.
+        **segment_options: Other keyword arguments of segment_combo_video.
+
+    Returns:
+        dict: Number of frames saved keyed by video path.
+    """
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        futures = {executor.submit(segment_combo_video, *job, **segment_options): job[0] for job in jobs}
+        for future in as_completed(futures):
+            video_path = futures[future]
+            try:
+                results[video_path] = future.result()
+            except Exception as e:
+                print(f"Error segmenting {video_path}: {e}")
+    return results
+
+
+if __name__ == "__main__":
+    videos_dir = '../Dataset/Videos'
+    segments_dir = '../Dataset/Segments'
+
+    # (video, output directory, letters signed in the video)
+    videos = [
+        ('NSL_Consonant_combo/S14_NSL_Consonant_RealWorld/S14_NSL_Consonant.mov',
+         '../Dataset/Images_20fr/NSL_Consonant_combo', list(gesture_mapping_consonants.keys())),
+        # ('NSL_Vowels_combo/S14_NSL_Vowel_RealWorld/S14_NSL_Vowel.mov',
+        #  '../Dataset/Images_20fr/NSL_Vowels_combo', list(gesture_mapping_vowels.keys())),
+    ]
+
+    jobs = []
+    for video, output_dir, gesture_keys in videos:
+        segment_file = os.path.join(segments_dir, os.path.splitext(os.path.basename(video))[0] + '.csv')
+        jobs.append((os.path.join(videos_dir, video), output_dir, gesture_keys, segment_file))
+
+    segment_combo_videos(jobs, frame_rate=20)
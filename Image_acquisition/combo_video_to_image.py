@@ -1,105 +1,291 @@
+# The script is used to capture the images of each letter from a single video showing several letters (combo video).
+# Interactive mode plays the video, 's' saves the current frame, 'n' moves to the next letter and 'q' quits.
+# The key presses can be exported to a segment file (letter, start, end in seconds), which headless mode replays
+# in a single decode pass at full decode speed. Segment files can also be written by hand with a time range per letter.
+
+import csv
 import cv2
 import os
-import uuid
 # import pygame
 import time
 # from moviepy import VideoFileClip
 from gesture_mapping import gesture_mapping_vowels, gesture_mapping_consonants
+from Image_acquisition.frame_writer import FrameWriter
+
+
+def frame_file_name(letter, video_path, frame_index):
+    """Name of a saved frame, <letter>_<video name>_<frame index>.jpg, the same in both modes."""
+    video_name = os.path.splitext(os.path.basename(video_path))[0]
+    return f"{letter}_{video_name}_{frame_index:06d}.jpg"
+
+
+def save_segments(segment_file, segments):
+    """
+    Writes segments to a csv file.
+
+    Args:
+        segment_file (str): Path to the csv file.
+        segments (list): (letter, start, end) tuples, times in seconds.
+    """
+    os.makedirs(os.path.dirname(segment_file) or ".", exist_ok=True)
+    with open(segment_file, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["letter", "start", "end"])
+        for letter, start, end in segments:
+            writer.writerow([letter, f"{start:.3f}", f"{end:.3f}"])
+
+
+def load_segments(segment_file, gesture_keys=None):
+    """
+    Reads segments from a csv file with a letter, start, end header.
+
+    Args:
+        segment_file (str): Path to the csv file.
+        gesture_keys (list): If given, letters that are not in it raise an error.
+
+    Returns:
+        list: (letter, start, end) tuples, times in seconds.
+    """
+    segments = []
+    with open(segment_file, "r", newline="") as file:
+        for row in csv.DictReader(file):
+            letter = row["letter"].strip()
+            start, end = float(row["start"]), float(row["end"])
+            if gesture_keys is not None and letter not in gesture_keys:
+                raise ValueError(f"Unknown letter '{letter}' in {segment_file}")
+            if end < start:
+                raise ValueError(f"Segment of '{letter}' ends before it starts in {segment_file}")
+            segments.append((letter, start, end))
+    return segments
+
+
+def segment_frame_indices(segments, fps, frame_rate=None):
+    """
+    Maps the frames to save to their letters.
+
+    A segment whose start equals its end (as exported from interactive mode) is a single frame. Longer
+    segments are sampled at frame_rate, or every frame is taken if frame_rate is None.
+
+    Args:
+        segments (list): (letter, start, end) tuples, times in seconds.
+        fps (float): Frame rate of the video.
+        frame_rate (float): Number of frames to extract per second of segment.
+
+    Returns:
+        dict: Letters keyed by frame index.
+    """
+    step = max(fps / frame_rate, 1.0) if frame_rate else 1.0
+    frames = {}
+    for letter, start, end in segments:
+        start_index = int(round(start * fps))
+        end_index = int(round(end * fps))
+        sample_count = 0
+        index = start_index
+        while index <= end_index:
+            frames.setdefault(index, [])
+            if letter not in frames[index]:
+                frames[index].append(letter)
+            sample_count += 1
+            index = start_index + int(sample_count * step + 0.5)
+    return frames
+
+
+def extract_segments(video_path, segment_file, output_dir, gesture_keys, frame_rate=None, jpeg_quality=95):
+    """
+    Extracts the frames listed in a segment file from a video without showing it.
+
+    The video is decoded once, frames outside the segments are grabbed but never converted to arrays, and
+    decoding stops after the last segment.
+
+    Args:
+        video_path (str): Path to the combo video.
+        segment_file (str): csv file of (letter, start, end) segments, see load_segments.
+        output_dir (str): Directory the per letter directories are created in.
+        gesture_keys (list): Letters allowed in the segment file.
+        frame_rate (float): Number of frames to extract per second of segment, None for every frame.
+        jpeg_quality (int): JPEG quality (0-100) of the saved frames.
+
+    Returns:
+        int: Number of frames saved.
+    """
+    segments = load_segments(segment_file, gesture_keys)
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError("Error: Cannot open video.")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if fps <= 0:
+        # Segments are in seconds, without a frame rate they would all map to frame 0
+        cap.release()
+        raise ValueError(f"Error: {video_path} reports no frame rate, re-encode it with a fixed frame rate")
+
+    frames = segment_frame_indices(segments, fps, frame_rate)
+    if not frames:
+        print(f"No segments in {segment_file}")
+        cap.release()
+        return 0
+    last_index = max(frames)
+
+    for letter in {letter for letter, _, _ in segments}:
+        os.makedirs(os.path.join(output_dir, letter), exist_ok=True)
+
+    print(f"Extracting {len(frames)} frames of {len(segments)} segments from {video_path}")
+    start_time = time.perf_counter()
+    frame_index = 0
+    with FrameWriter(jpeg_quality=jpeg_quality) as writer:
+        while frame_index <= last_index:
+            if not cap.grab():
+                print("End of video or error reading the video.")
+                break
+
+            letters = frames.get(frame_index)
+            if letters:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                for letter in letters:
+                    writer.submit(frame, os.path.join(output_dir, letter, frame_file_name(letter, video_path, frame_index)))
+            frame_index += 1
+    cap.release()
+
+    elapsed = time.perf_counter() - start_time
+    print(f"{writer.written} frames saved in {elapsed:.1f} seconds ({frame_index / max(elapsed, 1e-9):.1f} frames/sec decoded)")
+    return writer.written
 
-# Path to save the captured images
-output_dir = '../Dataset/Images_20fr/NSL_Consonant_combo'
-os.makedirs(output_dir, exist_ok=True)
-# Load the video
-video_path = '../Dataset/Videos/NSL_Consonant_combo/S14_NSL_Consonant_RealWorld/S14_NSL_Consonant.mov'  # Update with the actual path to your video file
-
-# # Use moviepy to extract audio from the videos
-# clip = VideoFileClip(video_path)
-# audio_path = '../extracted_audio.wav'
-# clip.audio.write_audiofile(audio_path)  # Extract and save audio as WAV file
-#
-# # Initialize pygame for audio playback
-# pygame.mixer.init()
-#
-# # Load and play the extracted audio
-# pygame.mixer.music.load(audio_path)
-# pygame.mixer.music.play(-1, 0.0)  # Loop the sound
-
-# Load the video for frame-by-frame processing
-cap = cv2.VideoCapture(video_path)
-
-if not cap.isOpened():
-    raise RuntimeError("Error: Cannot open video.")
-
-# Get the total number of frames and frames per second (fps) of the video
-fps = int(cap.get(cv2.CAP_PROP_FPS))
-total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-# gesture_keys = list(gesture_mapping_vowels.keys())
-gesture_keys = list(gesture_mapping_consonants.keys())
-count_letter=0
-letter_dir=os.path.join(output_dir,gesture_keys[count_letter])
-os.makedirs(letter_dir, exist_ok=True)
-
-# Get the duration of the video
-# video_duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps  # Duration in seconds
-# # video_duration = clip.duration  # Duration in seconds
-# start_time = time.time()
-cv2.namedWindow('Video', cv2.WINDOW_NORMAL)
-
-# Maximize the window
-cv2.resizeWindow('Video', 720, 640)
-# cv2.setWindowProperty('Video', cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        print("End of video or error reading the video.")
-        break
-
-    # Display the current frame
-    cv2.imshow('Video', frame)
-
-    key = cv2.waitKey(int(1000 / fps )) & 0xFF
-
-    # Capture image when spacebar is pressed
-    if key == ord('s'):
-        if count_letter < len(gesture_keys):
-            unique_id = uuid.uuid4().hex  # Generate a unique ID
-            filename = f"{gesture_keys[count_letter]}_{unique_id}.jpg"
-            file_path = os.path.join(letter_dir, filename)
-
-            # Save the captured frame as an image
-            cv2.imwrite(file_path, frame)
-            print(f"{file_path} saved")
-
-        else:
-            print("All gestures have been captured.")
-            break  # Stop if all gestures have been captured
-    elif key==ord('n'):
-        count_letter+=1
-        if count_letter < len(gesture_keys):
-            letter_dir = os.path.join(output_dir, gesture_keys[count_letter])
-            os.makedirs(letter_dir, exist_ok=True)
-            unique_id = uuid.uuid4().hex  # Generate a unique ID
-            filename = f"{gesture_keys[count_letter]}_{unique_id}.jpg"
-            file_path = os.path.join(letter_dir, filename)
-
-            # Save the captured frame as an image
-            cv2.imwrite(file_path, frame)
-            print(f"{file_path} saved")
-        else:
-            print("All gestures have been captured.")
+
+def label_video_interactively(video_path, output_dir, gesture_keys, session_file=None):
+    """
+    Plays a combo video and saves frames on key presses.
+
+    's' saves the current frame for the current letter, 'n' moves to the next letter (and saves the current
+    frame for it), 'q' quits.
+
+    Args:
+        video_path (str): Path to the combo video.
+        output_dir (str): Directory the per letter directories are created in.
+        gesture_keys (list): Letters in the order they are shown in the video.
+        session_file (str): If given, the saved frames are exported to this segment file so the session can be
+            replayed with extract_segments.
+
+    Returns:
+        list: (letter, start, end) segments of the saved frames.
+    """
+    # Load the video for frame-by-frame processing
+    cap = cv2.VideoCapture(video_path)
+
+    if not cap.isOpened():
+        raise RuntimeError("Error: Cannot open video.")
+
+    # Get the total number of frames and frames per second (fps) of the video
+    fps = int(cap.get(cv2.CAP_PROP_FPS))
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    exact_fps = cap.get(cv2.CAP_PROP_FPS)
+
+    count_letter = 0
+    letter_dir = os.path.join(output_dir, gesture_keys[count_letter])
+    os.makedirs(letter_dir, exist_ok=True)
+
+    # Get the duration of the video
+    # video_duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps  # Duration in seconds
+    # # video_duration = clip.duration  # Duration in seconds
+    # start_time = time.time()
+    cv2.namedWindow('Video', cv2.WINDOW_NORMAL)
+
+    # Maximize the window
+    cv2.resizeWindow('Video', 720, 640)
+    # cv2.setWindowProperty('Video', cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+
+    # Saved frames are encoded and written in the background so playback does not stall
+    writer = FrameWriter(jpeg_quality=95)
+    segments = []
+    frame_index = -1
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            print("End of video or error reading the video.")
             break
-    # Press 'q' to exit the video
-    if key == ord('q'):
-        print("Video playback terminated by user.")
-        break
-
-    # # If the video is finished, break the loop
-    # elapsed_time = time.time() - start_time
-    # if elapsed_time >= video_duration:
-    #     break
-
-# Stop the audio and release resources
-# pygame.mixer.music.stop()
-cap.release()
-cv2.destroyAllWindows()
+        frame_index += 1
+
+        # Display the current frame
+        cv2.imshow('Video', frame)
+
+        key = cv2.waitKey(int(1000 / fps)) & 0xFF
+
+        # Capture image when spacebar is pressed
+        if key == ord('s'):
+            if count_letter < len(gesture_keys):
+                file_path = os.path.join(letter_dir, frame_file_name(gesture_keys[count_letter], video_path, frame_index))
+
+                # Save the captured frame as an image
+                writer.submit(frame, file_path)
+                segments.append((gesture_keys[count_letter], frame_index / exact_fps, frame_index / exact_fps))
+                print(f"{file_path} saved")
+
+            else:
+                print("All gestures have been captured.")
+                break  # Stop if all gestures have been captured
+        elif key == ord('n'):
+            count_letter += 1
+            if count_letter < len(gesture_keys):
+                letter_dir = os.path.join(output_dir, gesture_keys[count_letter])
+                os.makedirs(letter_dir, exist_ok=True)
+                file_path = os.path.join(letter_dir, frame_file_name(gesture_keys[count_letter], video_path, frame_index))
+
+                # Save the captured frame as an image
+                writer.submit(frame, file_path)
+                segments.append((gesture_keys[count_letter], frame_index / exact_fps, frame_index / exact_fps))
+                print(f"{file_path} saved")
+            else:
+                print("All gestures have been captured.")
+                break
+        # Press 'q' to exit the video
+        if key == ord('q'):
+            print("Video playback terminated by user.")
+            break
+
+        # # If the video is finished, break the loop
+        # elapsed_time = time.time() - start_time
+        # if elapsed_time >= video_duration:
+        #     break
+
+    # Stop the audio and release resources
+    # pygame.mixer.music.stop()
+    cap.release()
+    writer.close()
+    cv2.destroyAllWindows()
+
+    if session_file:
+        save_segments(session_file, segments)
+        print(f"Session exported to {session_file}, {total_frames} frames in video")
+    return segments
+
+
+if __name__ == "__main__":
+    # Path to save the captured images
+    output_dir = '../Dataset/Images_20fr/NSL_Consonant_combo'
+    os.makedirs(output_dir, exist_ok=True)
+    # Load the video
+    video_path = '../Dataset/Videos/NSL_Consonant_combo/S14_NSL_Consonant_RealWorld/S14_NSL_Consonant.mov'  # Update with the actual path to your video file
+    # Segment file: written by interactive mode, read by headless mode
+    segment_file = '../Dataset/Segments/S14_NSL_Consonant.csv'
+    headless = False  # True to extract the frames of segment_file without playing the video
+
+    # # Use moviepy to extract audio from the videos
+    # clip = VideoFileClip(video_path)
+    # audio_path = '../extracted_audio.wav'
+    # clip.audio.write_audiofile(audio_path)  # Extract and save audio as WAV file
+    #
+    # # Initialize pygame for audio playback
+    # pygame.mixer.init()
+    #
+    # # Load and play the extracted audio
+    # pygame.mixer.music.load(audio_path)
+    # pygame.mixer.music.play(-1, 0.0)  # Loop the sound
+
+    # gesture_keys = list(gesture_mapping_vowels.keys())
+    gesture_keys = list(gesture_mapping_consonants.keys())
+
+    if headless:
+        extract_segments(video_path, segment_file, output_dir, gesture_keys)
+    else:
+        label_video_interactively(video_path, output_dir, gesture_keys, session_file=segment_file)
@@ -0,0 +1,64 @@
+# Manifest of the videos already extracted into an output tree, used by video_to_image to skip unchanged videos
+# on a re-run and to resume videos that were interrupted half way.
+# The manifest is a json file at the root of the output tree, keyed by the video path relative to its parent directory.
+
+import json
+import os
+
+MANIFEST_NAME = "extraction_manifest.json"
+
+
+def load_manifest(output_parent_dir):
+    """
+    Loads the manifest of an output tree.
+
+    Args:
+        output_parent_dir (str): Root of the output tree.
+
+    Returns:
+        dict: Manifest entries keyed by video path, empty if there is no manifest yet.
+    """
+    manifest_path = os.path.join(output_parent_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+
+    try:
+        with open(manifest_path, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Warning: ignoring unreadable manifest {manifest_path}: {e}")
+        return {}
+
+
+def save_manifest(output_parent_dir, manifest):
+    """Writes the manifest of an output tree, replacing the old one atomically."""
+    os.makedirs(output_parent_dir, exist_ok=True)
+    manifest_path = os.path.join(output_parent_dir, MANIFEST_NAME)
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+
+def video_signature(video_path, params):
+    """
+    Describes a video and the parameters it is extracted with.
+
+    Two signatures are equal when the video file is unchanged (same size and modification time) and it is
+    sampled the same way, in which case its frames do not need to be extracted again.
+
+    Args:
+        video_path (str): Path to the video file.
+        params (dict): Sampling parameters (frame rate, decoding mode, ...), must be json serializable.
+
+    Returns:
+        dict: Signature of the video.
+    """
+    stat = os.stat(video_path)
+    # Round trip through json so tuples compare equal to the lists read back from the manifest
+    return {"size": stat.st_size, "mtime": stat.st_mtime, "params": json.loads(json.dumps(params))}
+
+
+def is_same_video(entry, signature):
+    """Checks whether a manifest entry was recorded for the given video signature."""
+    return entry is not None and all(entry.get(key) == value for key, value in signature.items())
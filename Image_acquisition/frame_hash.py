@@ -0,0 +1,72 @@
+# Perceptual hashing used to drop near-duplicate frames while extracting them from videos.
+# Signers hold each pose for a few seconds, so consecutive frames are often almost identical.
+
+import cv2
+import numpy as np
+
+
+def dhash(image, hash_size=8):
+    """
+    Computes the difference hash of an image.
+
+    The image is shrunk to (hash_size + 1) x hash_size grayscale pixels and each bit of the hash tells whether a
+    pixel is brighter than its right neighbour, so the hash only changes when the picture visibly changes.
+
+    Args:
+        image (numpy.ndarray): Input image (BGR or grayscale).
+        hash_size (int): Number of rows of the hash, the hash has hash_size * hash_size bits.
+
+    Returns:
+        int: The hash.
+    """
+    # Shrinking first makes the grayscale conversion almost free on large frames
+    small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    diff = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(diff).tobytes(), "big")
+
+
+def hamming_distance(hash1, hash2):
+    """Number of bits that differ between two hashes."""
+    return bin(hash1 ^ hash2).count("1")
+
+
+class DuplicateFilter:
+    """
+    Tells whether a frame is a near duplicate of the last frame that was kept.
+
+    Args:
+        threshold (int): Frames whose hash differs from the last kept frame by at most this many bits
+            are duplicates.
+        hash_size (int): Size of the difference hash, see dhash.
+    """
+
+    def __init__(self, threshold=3, hash_size=8):
+        self.threshold = threshold
+        self.hash_size = hash_size
+        self.last_hash = None
+        self.dropped = 0
+
+    def is_duplicate(self, image_hash):
+        """
+        Returns True (and counts it as dropped) if a hash is within threshold of the last kept frame. The frame is
+        not remembered, call remember once it is actually kept (e.g. after other checks on it passed).
+        """
+        if self.last_hash is not None and hamming_distance(image_hash, self.last_hash) <= self.threshold:
+            self.dropped += 1
+            return True
+        return False
+
+    def remember(self, image_hash):
+        """Makes a hash the reference of the next comparisons."""
+        self.last_hash = image_hash
+
+    def keep(self, image):
+        """Returns False if the image is a near duplicate of the last kept image, otherwise remembers it."""
+        image_hash = dhash(image, self.hash_size)
+        if self.is_duplicate(image_hash):
+            return False
+
+        self.remember(image_hash)
+        return True
@@ -0,0 +1,89 @@
+# Background JPEG writer shared by the image acquisition scripts (video_to_image, combo_video_to_image,
+# capture_image). Frames are pushed into a bounded queue by the capture loop and a pool of threads does the
+# resize, JPEG encoding and disk write. OpenCV releases the GIL while encoding, so the threads run in parallel
+# with decoding instead of stalling it.
+
+import os
+import queue
+import threading
+import cv2
+
+
+class FrameWriter:
+    """
+    Writes frames to disk on background threads.
+
+    submit() blocks once max_pending frames are waiting, so a slow disk slows the capture loop down
+    instead of letting the queue grow without bound.
+
+    Args:
+        num_threads (int): Number of writer threads.
+        max_pending (int): Maximum number of frames waiting to be written.
+        jpeg_quality (int): JPEG quality (0-100) used for .jpg/.jpeg files.
+        transform (callable): Optional function applied to each frame on the writer thread before
+            encoding (e.g. a resize).
+    """
+
+    _STOP = object()
+
+    def __init__(self, num_threads=2, max_pending=64, jpeg_quality=95, transform=None):
+        self.jpeg_quality = jpeg_quality
+        self.transform = transform
+        self.written = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(num_threads)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, frame, path):
+        """Queues a frame to be written to path, blocking while the queue is full."""
+        if not self._threads:
+            raise RuntimeError("FrameWriter is closed")
+        self._queue.put((frame, path))
+
+    def close(self):
+        """Waits for all queued frames to be written and stops the writer threads."""
+        for _ in self._threads:
+            self._queue.put(self._STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _run(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                break
+
+            frame, path = item
+            # Written under a temporary name and renamed, so an interrupted run never leaves a truncated image
+            base, ext = os.path.splitext(path)
+            temp_path = f"{base}.tmp{ext}"
+            try:
+                if self.transform is not None:
+                    frame = self.transform(frame)
+                if ext.lower() in ('.jpg', '.jpeg'):
+                    ok = cv2.imwrite(temp_path, frame, params)
+                else:
+                    ok = cv2.imwrite(temp_path, frame)
+                if ok:
+                    os.replace(temp_path, path)
+            except Exception as e:
+                print(f"Error writing {path}: {e}")
+                ok = False
+
+            with self._lock:
+                if ok:
+                    self.written += 1
+                else:
+                    self.failed += 1
+                    print(f"Error: could not write {path}")
@@ -1,18 +1,46 @@
 # The script is used to convert videos in a directory to images of each letter. A folder of images for each letter is created.
 # The video used here shows only single alphabet.
-# Needs to be run 3 times (vowel, consonants_part1, consonants_part2)
+# All parent directories (vowel, consonants_part1, consonants_part2) are processed in one run by
+# process_video_trees, which spreads the videos over a process pool.
 
-import uuid
 import cv2
+import inspect
+import numpy as np
 import os
+import re
+import time
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def resize_with_aspect_ratio(image, target_size=(640, 640)):
+from Image_acquisition.frame_writer import FrameWriter
+from Image_acquisition.extraction_manifest import load_manifest, save_manifest, video_signature, is_same_video
+from Image_acquisition.frame_hash import DuplicateFilter, dhash
+from Preprocessing.yolo_labels import hand_landmarks_array
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv')
+
+RESIZE_MODES = ("stretch", "crop", "letterbox")
+
+
+def pick_interpolation(image, target_size):
+    """Returns INTER_AREA when the image is shrunk (sharper and alias free) and INTER_LINEAR when it is enlarged."""
+    height, width = image.shape[:2]
+    if target_size[0] * target_size[1] < width * height:
+        return cv2.INTER_AREA
+    return cv2.INTER_LINEAR
+
+
+def resize_with_aspect_ratio(image, target_size=(640, 640), interpolation=None):
     """
     Resize an image to the target size while maintaining aspect ratio by cropping.
 
+    The center region with the target aspect ratio is cropped first, so the pixels that
+    would be thrown away are never resized.
+
     Args:
         image (numpy.ndarray): Input image.
         target_size (tuple): Target size as (width, height).
+        interpolation (int): OpenCV interpolation flag, picked from the scale factor if None.
 
     Returns:
         numpy.ndarray: Resized and cropped image.
@@ -22,20 +50,196 @@ def resize_with_aspect_ratio(image, target_size=(640, 640)):
 
     # Calculate the scaling factor
     scale = max(target_width / width, target_height / height)
-    resized_width = int(width * scale)
-    resized_height = int(height * scale)
+    crop_width = min(width, round(target_width / scale))
+    crop_height = min(height, round(target_height / scale))
+
+    # Crop the center
+    start_x = (width - crop_width) // 2
+    start_y = (height - crop_height) // 2
+    cropped_image = image[start_y:start_y + crop_height, start_x:start_x + crop_width]
 
     # Resize the image
-    resized_image = cv2.resize(image, (resized_width, resized_height))
+    if interpolation is None:
+        interpolation = pick_interpolation(cropped_image, target_size)
+    return cv2.resize(cropped_image, (target_width, target_height), interpolation=interpolation)
 
-    # Crop the center
-    start_x = (resized_width - target_width) // 2
-    start_y = (resized_height - target_height) // 2
-    cropped_image = resized_image[start_y:start_y + target_height, start_x:start_x + target_width]
 
-    return cropped_image
+def letterbox_image(image, target_size=(640, 640), interpolation=None, color=(114, 114, 114)):
+    """
+    Resize an image to fit in the target size while maintaining aspect ratio, padding the rest.
+
+    Args:
+        image (numpy.ndarray): Input image.
+        target_size (tuple): Target size as (width, height).
+        interpolation (int): OpenCV interpolation flag, picked from the scale factor if None.
+        color (tuple): BGR color of the padding (YOLO's gray by default).
+
+    Returns:
+        numpy.ndarray: Resized and padded image.
+    """
+    target_width, target_height = target_size
+    height, width = image.shape[:2]
+
+    scale = min(target_width / width, target_height / height)
+    resized_width = min(target_width, round(width * scale))
+    resized_height = min(target_height, round(height * scale))
+
+    if interpolation is None:
+        interpolation = pick_interpolation(image, (resized_width, resized_height))
+    resized_image = cv2.resize(image, (resized_width, resized_height), interpolation=interpolation)
+
+    pad_x = target_width - resized_width
+    pad_y = target_height - resized_height
+    return cv2.copyMakeBorder(resized_image, pad_y // 2, pad_y - pad_y // 2, pad_x // 2, pad_x - pad_x // 2,
+                              cv2.BORDER_CONSTANT, value=color)
+
+
+def fit_frame(frame, target_size=(640, 640), resize_mode="stretch", interpolation=None):
+    """
+    Brings a frame to the size saved by extract_frames.
+
+    Args:
+        frame (numpy.ndarray): Input frame.
+        target_size (tuple): Target size as (width, height).
+        resize_mode (str): "stretch" resizes to the target size ignoring the aspect ratio, "crop" keeps the
+            aspect ratio and crops the center, "letterbox" keeps the aspect ratio and pads.
+        interpolation (int): OpenCV interpolation flag, INTER_AREA when shrinking and INTER_LINEAR when
+            enlarging if None.
+
+    Returns:
+        numpy.ndarray: Resized frame.
+    """
+    if resize_mode == "crop":
+        return resize_with_aspect_ratio(frame, target_size, interpolation)
+    if resize_mode == "letterbox":
+        return letterbox_image(frame, target_size, interpolation)
+    if interpolation is None:
+        interpolation = pick_interpolation(frame, target_size)
+    return cv2.resize(frame, target_size, interpolation=interpolation)
+
 
-def extract_frames(video_path, output_dir, video_name, frame_rate=10):
+def request_decode_size(video_capture, target_size):
+    """
+    Asks the capture backend to decode frames at a reduced resolution that still covers target_size.
+
+    Only some backends (e.g. GStreamer pipelines, some camera drivers) honour this, file backends such as
+    FFmpeg usually ignore it. The size actually delivered is checked, so callers can rely on the result.
+
+    Args:
+        video_capture (cv2.VideoCapture): Opened capture.
+        target_size (tuple): Size the frames are resized to afterwards, as (width, height).
+
+    Returns:
+        bool: True if the backend now decodes at the reduced resolution.
+    """
+    width = video_capture.get(cv2.CAP_PROP_FRAME_WIDTH)
+    height = video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT)
+    if width <= 0 or height <= 0:
+        return False
+
+    scale = max(target_size[0] / width, target_size[1] / height)
+    if scale >= 1:
+        return False
+    decode_width, decode_height = int(round(width * scale)), int(round(height * scale))
+
+    video_capture.set(cv2.CAP_PROP_FRAME_WIDTH, decode_width)
+    video_capture.set(cv2.CAP_PROP_FRAME_HEIGHT, decode_height)
+    return int(video_capture.get(cv2.CAP_PROP_FRAME_WIDTH)) == decode_width and \
+        int(video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT)) == decode_height
+
+def sample_frame_indices(fps, frame_rate):
+    """
+    Yields the indices of the frames to keep when sampling a video at frame_rate.
+
+    Frames are selected by timestamp rather than by a fixed integer interval, so the
+    output rate stays correct when fps / frame_rate is not a whole number.
+
+    Args:
+        fps (float): Frame rate of the source video.
+        frame_rate (float): Number of frames to extract per second of video.
+
+    Yields:
+        int: Index of the next frame to save, in increasing order.
+    """
+    if frame_rate <= 0:
+        raise ValueError("frame_rate must be greater than 0")
+
+    # Never sample faster than the source, every frame is then kept
+    step = max(fps / frame_rate, 1.0) if fps > 0 else 1.0
+    sample_count = 0
+    last_index = -1
+    while True:
+        index = int(sample_count * step + 0.5)
+        if index > last_index:
+            yield index
+            last_index = index
+        sample_count += 1
+
+
+def video_letter(video_name):
+    """Returns the letter shown in a video, video names are <signer>_<letter> (e.g. S1_KA)."""
+    return video_name.split("_", 1)[1] if "_" in video_name else video_name
+
+
+def frame_file_prefix(video_name):
+    """
+    Returns the prefix of the frame filenames of a video.
+
+    Frames are named <letter>_<video name>_<frame index>.jpg, e.g. A_S1_A_000042.jpg for frame 42 of S1_A.mp4,
+    so re-extracting a video overwrites the same files instead of adding new ones.
+    """
+    return f"{video_letter(video_name)}_{video_name}_"
+
+
+def existing_frame_indices(output_dir, video_name):
+    """Returns the indices of the frames of a video already saved in output_dir."""
+    if not os.path.isdir(output_dir):
+        return set()
+
+    pattern = re.compile(re.escape(frame_file_prefix(video_name)) + r"(\d{6})\.jpg$")
+    indices = set()
+    for file_name in os.listdir(output_dir):
+        match = pattern.match(file_name)
+        if match:
+            indices.add(int(match.group(1)))
+    return indices
+
+
+def remove_frames(output_dir, video_name):
+    """Deletes the frames of a video saved in output_dir, returns the number of files deleted."""
+    prefix = frame_file_prefix(video_name)
+    total_deleted = 0
+    if not os.path.isdir(output_dir):
+        return total_deleted
+
+    for file_name in os.listdir(output_dir):
+        if file_name.startswith(prefix):
+            os.remove(os.path.join(output_dir, file_name))
+            total_deleted += 1
+    return total_deleted
+
+
+def detect_hand_landmarks(hands, frame):
+    """
+    Runs MediaPipe Hands on a BGR frame.
+
+    Args:
+        hands (mediapipe.solutions.hands.Hands): Hands instance, reused across frames.
+        frame (numpy.ndarray): Input frame (BGR).
+
+    Returns:
+        numpy.ndarray: Normalized (x, y, z) landmarks as a (hands, 21, 3) float32 array, None if no hand is found.
+    """
+    results = hands.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    if not results.multi_hand_landmarks:
+        return None
+    return hand_landmarks_array(results.multi_hand_landmarks)
+
+
+def extract_frames(video_path, output_dir, video_name, frame_rate=10, sampling="grab", jpeg_quality=95,
+                   writer_threads=2, resume=False, dedup_threshold=None, target_size=(640, 640),
+                   resize_mode="stretch", interpolation=None, reduced_decode=False, require_hand=False,
+                   hand_confidence=0.8, save_landmarks=False):
     """
     Extracts frames from a video and saves them to a directory.
 
@@ -44,9 +248,48 @@ def extract_frames(video_path, output_dir, video_name, frame_rate=10):
         output_dir (str): Directory to save the extracted frames.
         video_name (str): Name of the video, used in the frame filenames.
         frame_rate (int): Number of frames to extract per second of video.
+        sampling (str): "grab" only decodes the frames that are saved (skipped frames are
+            grabbed but never converted to arrays), "read" decodes every frame.
+        jpeg_quality (int): JPEG quality (0-100) of the saved frames.
+        writer_threads (int): Number of threads resizing, encoding and writing frames while
+            the video keeps decoding.
+        resume (bool): Keep the frames already saved for this video and only extract the missing ones.
+            Decoding starts at the first missing frame.
+        dedup_threshold (int): If set, frames whose difference hash (see frame_hash.py) is within this
+            many bits of the last saved frame are dropped. Frames are hashed after resizing to target_size,
+            like the saved frame a resumed run compares against. When resuming, missing frames before the last
+            saved one are then treated as dropped duplicates and decoding continues after it.
+        target_size (tuple): Size of the saved frames as (width, height).
+        resize_mode (str): How frames are brought to target_size: "stretch", "crop" or "letterbox",
+            see fit_frame.
+        interpolation (int): OpenCV interpolation flag, INTER_AREA when shrinking if None.
+        reduced_decode (bool): Ask the backend to decode at a reduced resolution covering target_size,
+            see request_decode_size. Ignored if the backend does not support it.
+        require_hand (bool): Only save frames in which MediaPipe Hands finds a hand. One Hands instance
+            in video (tracking) mode is used for the whole video, and frames are checked after resizing.
+            As with dedup_threshold, resuming continues after the last saved frame.
+        hand_confidence (float): min_detection_confidence of the Hands instance.
+        save_landmarks (bool): With require_hand, also save the normalized hand landmarks of each frame
+            as a (hands, 21, 3) array in <frame name>_landmarks.npy.
+
+    Returns:
+        dict: Number of frames read ("frames_read"), saved ("frames_saved"), already present
+            ("frames_existing"), dropped as near duplicates ("frames_duplicate") and dropped
+            because no hand was found ("frames_no_hand").
     """
-    if "_" in video_name:
-        video_name = video_name.split("_", 1)[1]
+    if sampling not in ("grab", "read"):
+        raise ValueError(f"Unknown sampling mode '{sampling}', expected 'grab' or 'read'")
+    if resize_mode not in RESIZE_MODES:
+        raise ValueError(f"Unknown resize mode '{resize_mode}', expected one of {RESIZE_MODES}")
+
+    frame_prefix = frame_file_prefix(video_name)
+    existing = existing_frame_indices(output_dir, video_name) if resume else set()
+
+    # Leftovers of frames that were being written when a previous run was interrupted
+    if os.path.isdir(output_dir):
+        for file_name in os.listdir(output_dir):
+            if file_name.startswith(frame_prefix) and ".tmp." in file_name:
+                os.remove(os.path.join(output_dir, file_name))
 
     # Create the output directory if it doesn't exist
     if not os.path.exists(output_dir):
@@ -55,43 +298,134 @@ def extract_frames(video_path, output_dir, video_name, frame_rate=10):
     # Capture the video
     video_capture = cv2.VideoCapture(video_path)
 
+    stats = {"frames_read": 0, "frames_saved": 0, "frames_existing": len(existing), "frames_duplicate": 0,
+             "frames_no_hand": 0}
     if not video_capture.isOpened():
         print(f"Error: Unable to open video file {video_path}")
-        return
+        return stats
 
     # Get video properties
     fps = video_capture.get(cv2.CAP_PROP_FPS)
     total_frames = int(video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
-    duration = total_frames / fps
+    duration = total_frames / fps if fps > 0 else 0
 
     print(f"Processing '{video_path}'")
     print(f" - Total Frames: {total_frames}")
     print(f" - FPS: {fps}")
     print(f" - Duration: {duration:.2f} seconds")
-
-    # Calculate the interval between frames to save
-    interval = int(fps / frame_rate)
+    if reduced_decode:
+        if request_decode_size(video_capture, target_size):
+            print(f" - Decoding at {int(video_capture.get(cv2.CAP_PROP_FRAME_WIDTH))}x"
+                  f"{int(video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT))}")
+        else:
+            print(" - Reduced resolution decoding not supported by the backend, decoding at full size")
+
+    duplicate_filter = DuplicateFilter(dedup_threshold) if dedup_threshold is not None else None
+    done = existing
+    if (duplicate_filter is not None or require_hand) and existing:
+        done = set(range(max(existing) + 1))
+        last_frame = cv2.imread(os.path.join(output_dir, f"{frame_prefix}{max(existing):06d}.jpg"))
+        if last_frame is not None and duplicate_filter is not None:
+            # The saved frame is already resized, as are the frames it is compared with
+            duplicate_filter.remember(dhash(last_frame, duplicate_filter.hash_size))
+
+    # Frames to save are picked by timestamp, see sample_frame_indices
+    frames_to_save = sample_frame_indices(fps, frame_rate)
+    next_index = next(frames_to_save)
+    while next_index in done:
+        next_index = next(frames_to_save)
     frame_count = 0
     saved_frame_count = 0
 
-    while True:
-        ret, frame = video_capture.read()
-        if not ret:
-            break
-
-        # Save every 'interval' frame
-        if frame_count % interval == 0:
-            unique_id = uuid.uuid4()  # Generate a unique identifier
-            frame_filename = os.path.join(output_dir, f"{video_name}_{unique_id}_{saved_frame_count:04d}.jpg")
-            frame = cv2.resize(frame, (640, 640))           # check before saving
-            # frame = resize_with_aspect_ratio(frame, target_size=(640, 640))
-            cv2.imwrite(frame_filename, frame)
-            saved_frame_count += 1
-
-    video_capture.release()
+    # Jump to the first missing frame when resuming, seeking is only trusted if the backend lands exactly on it
+    if next_index > 0 and done:
+        if video_capture.set(cv2.CAP_PROP_POS_FRAMES, next_index) and \
+                int(video_capture.get(cv2.CAP_PROP_POS_FRAMES)) == next_index:
+            frame_count = next_index
+        else:
+            video_capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        print(f" - Resuming at frame {next_index}, {len(existing)} frames already saved")
+    start_frame = frame_count
+
+    resize = partial(fit_frame, target_size=tuple(target_size), resize_mode=resize_mode, interpolation=interpolation)
+
+    hands = None
+    if require_hand:
+        import mediapipe as mp  # only needed when frames are gated on hand presence
+        hands = mp.solutions.hands.Hands(static_image_mode=False, max_num_hands=1,
+                                         min_detection_confidence=hand_confidence, min_tracking_confidence=0.5)
+    # Hands and the duplicate filter must see the saved (resized) frame, the same pixels as the saved frame a
+    # resumed run is seeded from, so resizing happens here instead of on the writer threads
+    resize_in_loop = hands is not None or duplicate_filter is not None
+    if resize_in_loop:
+        writer = FrameWriter(num_threads=writer_threads, jpeg_quality=jpeg_quality)
+    else:
+        writer = FrameWriter(num_threads=writer_threads, jpeg_quality=jpeg_quality, transform=resize)
+    no_hand_count = 0
+
+    # The writer threads and the Hands instance are closed even if decoding fails
+    try:
+        while True:
+            if sampling == "grab":
+                # grab() only demuxes/decodes, the costly conversion to a BGR array
+                # is done by retrieve() for the frames that are actually saved
+                ret = video_capture.grab()
+                frame = None
+            else:
+                ret, frame = video_capture.read()
+            if not ret:
+                break
+
+            if frame_count == next_index:
+                if frame is None:
+                    ret, frame = video_capture.retrieve()
+                    if not ret:
+                        break
+                if resize_in_loop:
+                    frame = resize(frame)
+                image_hash = None
+                if duplicate_filter is not None:
+                    image_hash = dhash(frame, duplicate_filter.hash_size)
+                if image_hash is None or not duplicate_filter.is_duplicate(image_hash):
+                    landmarks = None
+                    if hands is not None:
+                        landmarks = detect_hand_landmarks(hands, frame)
+
+                    if hands is not None and landmarks is None:
+                        no_hand_count += 1
+                    else:
+                        frame_filename = os.path.join(output_dir, f"{frame_prefix}{frame_count:06d}.jpg")
+                        writer.submit(frame, frame_filename)  # (resized and) written on a writer thread
+                        if image_hash is not None:
+                            # Only saved frames are references, a frame dropped for having no hand is not
+                            duplicate_filter.remember(image_hash)
+                        if save_landmarks and landmarks is not None:
+                            np.save(os.path.join(output_dir, f"{frame_prefix}{frame_count:06d}_landmarks.npy"),
+                                    landmarks)
+                        saved_frame_count += 1
+                next_index = next(frames_to_save)
+                while next_index in done:
+                    next_index = next(frames_to_save)
+
+            frame_count += 1
+    finally:
+        video_capture.release()
+        writer.close()
+        if hands is not None:
+            hands.close()
     print(f"Frames saved to {output_dir}: {saved_frame_count} frames extracted")
-
-def process_videos(input_dir, output_dir, frame_rate=10):
+    if duplicate_filter:
+        print(f" - {duplicate_filter.dropped} near-duplicate frames dropped")
+        stats["frames_duplicate"] = duplicate_filter.dropped
+    if hands is not None:
+        print(f" - {no_hand_count} frames without a hand dropped")
+        stats["frames_no_hand"] = no_hand_count
+
+    stats["frames_read"] = frame_count - start_frame
+    stats["frames_saved"] = writer.written
+    return stats
+
+def process_videos(input_dir, output_dir, frame_rate=10, **extract_options):
     """
     Processes all videos in a directory, extracting frames for each video.
 
@@ -99,9 +433,11 @@ def process_videos(input_dir, output_dir, frame_rate=10):
         input_dir (str): Directory containing video files.
         output_dir (str): Directory to save all extracted frames.
         frame_rate (int): Number of frames to extract per second of video.
+        **extract_options: Other keyword arguments of extract_frames (sampling, jpeg_quality,
+            dedup_threshold, resize_mode, ...).
     """
     # Get a list of all video files in the input directory
-    video_files = [f for f in os.listdir(input_dir) if f.lower().endswith(('.mp4', '.mov', '.avi', '.mkv'))]
+    video_files = [f for f in os.listdir(input_dir) if f.lower().endswith(VIDEO_EXTENSIONS)]
 
     if not video_files:
         print("No video files found in the input directory.")
@@ -117,7 +453,202 @@ def process_videos(input_dir, output_dir, frame_rate=10):
         video_output_dir = os.path.join(output_dir, video_name)
 
         # Extract frames for the current video
-        extract_frames(video_path, video_output_dir, video_name, frame_rate)
+        extract_frames(video_path, video_output_dir, video_name, frame_rate, **extract_options)
+
+def video_duration(video_path):
+    """
+    Reads the duration of a video from its container metadata without decoding it.
+
+    Args:
+        video_path (str): Path to the video file.
+
+    Returns:
+        float: Duration in seconds, 0 if it cannot be determined.
+    """
+    video_capture = cv2.VideoCapture(video_path)
+    if not video_capture.isOpened():
+        return 0.0
+    fps = video_capture.get(cv2.CAP_PROP_FPS)
+    total_frames = video_capture.get(cv2.CAP_PROP_FRAME_COUNT)
+    video_capture.release()
+    return total_frames / fps if fps > 0 else 0.0
+
+
+def collect_video_jobs(parent_dir, output_parent_dir):
+    """
+    Lists every video under the subdirectories of a parent directory.
+
+    The output layout matches process_videos: <output_parent_dir>/<sub_dir>/<video_name>.
+
+    Args:
+        parent_dir (str): Directory containing one subdirectory of videos per signer.
+        output_parent_dir (str): Directory the extracted frames are saved under.
+
+    Returns:
+        list: (video_path, video_output_dir, video_name) tuples.
+    """
+    jobs = []
+    for sub_dir in sorted(os.listdir(parent_dir)):
+        sub_dir_path = os.path.join(parent_dir, sub_dir)
+        if not os.path.isdir(sub_dir_path):
+            continue
+
+        for video_file in sorted(os.listdir(sub_dir_path)):
+            if not video_file.lower().endswith(VIDEO_EXTENSIONS):
+                continue
+            video_name = os.path.splitext(video_file)[0]
+            jobs.append((os.path.join(sub_dir_path, video_file),
+                         os.path.join(output_parent_dir, sub_dir, video_name),
+                         video_name))
+    return jobs
+
+
+def _init_worker():
+    """Limits OpenCV to one thread per worker so the pool does not oversubscribe the cores."""
+    cv2.setNumThreads(1)
+
+
+# extract_frames arguments that do not change the saved frames, left out of the manifest
+_NON_OUTPUT_OPTIONS = ("sampling", "writer_threads", "resume", "reduced_decode")
+
+
+def output_params(frame_rate, extract_options):
+    """
+    Returns the extract_frames parameters that determine the saved frames, with defaults filled in.
+
+    Args:
+        frame_rate (int): Number of frames extracted per second of video.
+        extract_options (dict): Keyword arguments passed to extract_frames.
+
+    Returns:
+        dict: Parameter values keyed by name.
+    """
+    params = {name: parameter.default for name, parameter in inspect.signature(extract_frames).parameters.items()
+              if parameter.default is not inspect.Parameter.empty and name not in _NON_OUTPUT_OPTIONS}
+    params.update((name, value) for name, value in extract_options.items() if name not in _NON_OUTPUT_OPTIONS)
+    params["frame_rate"] = frame_rate
+    return params
+
+
+def _extract_frames_job(video_path, video_output_dir, video_name, frame_rate, resume, extract_options):
+    """Runs extract_frames in a worker process and times it."""
+    start_time = time.perf_counter()
+    stats = extract_frames(video_path, video_output_dir, video_name, frame_rate, resume=resume, **extract_options)
+    stats["seconds"] = time.perf_counter() - start_time
+    return stats
+
+
+def process_video_trees(dir_pairs, frame_rate=10, workers=None, **extract_options):
+    """
+    Extracts frames from every video under one or more parent directories in parallel.
+
+    Videos are scheduled longest first so that a long recording started last does not
+    keep a single worker busy after the others are done.
+
+    Each output tree keeps a manifest (see extraction_manifest.py) of the videos extracted into it.
+    Videos already extracted with the same parameters are skipped, videos that were interrupted are
+    resumed, and videos that changed or are sampled differently are extracted again from scratch.
+
+    Args:
+        dir_pairs (list): (parent_dir, output_parent_dir) pairs, laid out as in __main__.
+        frame_rate (int): Number of frames to extract per second of video.
+        workers (int): Number of worker processes, defaults to the number of cores.
+        **extract_options: Other keyword arguments of extract_frames (sampling, jpeg_quality,
+            dedup_threshold, resize_mode, require_hand, ...). With dedup_threshold or require_hand
+            set, the number of dropped frames is reported per letter at the end.
+
+    Returns:
+        dict: Stats returned by extract_frames plus "seconds", keyed by video path.
+    """
+    params = output_params(frame_rate, extract_options)
+
+    jobs = []
+    manifests = {}
+    job_keys = {}
+    skipped = 0
+    for parent_dir, output_parent_dir in dir_pairs:
+        if not os.path.isdir(parent_dir):
+            print(f"Skipping missing directory: {parent_dir}")
+            continue
+
+        manifest = manifests.setdefault(output_parent_dir, load_manifest(output_parent_dir))
+        for video_path, video_output_dir, video_name in collect_video_jobs(parent_dir, output_parent_dir):
+            key = os.path.relpath(video_path, parent_dir).replace(os.sep, "/")
+            signature = video_signature(video_path, params)
+            entry = manifest.get(key)
+
+            if is_same_video(entry, signature):
+                if entry.get("complete"):
+                    skipped += 1
+                    continue
+                resume = True
+            else:
+                # New video, or its frames were extracted from another version or with other parameters
+                remove_frames(video_output_dir, video_name)
+                resume = False
+
+            manifest[key] = dict(signature, complete=False)
+            job_keys[video_path] = (output_parent_dir, key)
+            jobs.append((video_path, video_output_dir, video_name, resume))
+
+    for output_parent_dir, manifest in manifests.items():
+        save_manifest(output_parent_dir, manifest)
+
+    if skipped:
+        print(f"Skipping {skipped} video(s) already extracted")
+    if not jobs:
+        print("No video files to process.")
+        return {}
+
+    durations = {job[0]: video_duration(job[0]) for job in jobs}
+    jobs.sort(key=lambda job: durations[job[0]], reverse=True)
+
+    workers = workers or os.cpu_count() or 1
+    print(f"Found {len(jobs)} video(s), {sum(durations.values()):.2f} seconds in total, using {workers} worker(s)")
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = {}
+        for video_path, video_output_dir, video_name, resume in jobs:
+            future = executor.submit(_extract_frames_job, video_path, video_output_dir, video_name,
+                                     frame_rate, resume, extract_options)
+            futures[future] = video_path
+
+        for future in as_completed(futures):
+            video_path = futures[future]
+            try:
+                stats = future.result()
+            except Exception as e:
+                print(f"Error processing {video_path}: {e}")
+                continue
+
+            results[video_path] = stats
+            if stats["frames_read"] == 0 and stats["frames_existing"] == 0:
+                continue  # the video could not be read, it is tried again on the next run
+            throughput = stats["frames_read"] / stats["seconds"] if stats["seconds"] > 0 else 0
+            print(f"Done '{video_path}': {stats['frames_saved']} frames saved, {throughput:.1f} frames/sec")
+
+            # Recorded as soon as the video is done, so an interrupted run keeps the finished videos
+            output_parent_dir, key = job_keys[video_path]
+            manifest = manifests[output_parent_dir]
+            manifest[key]["complete"] = True
+            manifest[key]["frames_saved"] = stats["frames_saved"] + stats["frames_existing"]
+            save_manifest(output_parent_dir, manifest)
+
+    if extract_options.get("dedup_threshold") is not None or extract_options.get("require_hand"):
+        letter_counts = {}
+        for video_path, stats in results.items():
+            letter = video_letter(os.path.splitext(os.path.basename(video_path))[0])
+            counts = letter_counts.setdefault(letter, [0, 0, 0])
+            counts[0] += stats["frames_saved"]
+            counts[1] += stats["frames_duplicate"]
+            counts[2] += stats["frames_no_hand"]
+
+        print("Frames dropped per letter:")
+        for letter, (saved, duplicates, no_hand) in sorted(letter_counts.items()):
+            print(f" - {letter}: {duplicates} near duplicates, {no_hand} without a hand, {saved} saved")
+
+    return results
 
 # if __name__ == "__main__":
 # Example usage
@@ -128,33 +659,17 @@ def process_videos(input_dir, output_dir, frame_rate=10):
 #     process_videos(input_dir, output_dir, frame_rate)
 
 if __name__ == "__main__":
-    # Parent directory containing subdirectories of videos
-
-    # part 1
-    # parent_dir = "../Dataset/Videos/NSL_Vowel"
-    # output_parent_dir = "../Dataset/Images_20fr/NSL_Vowel"
-
-    # part 2
-    # parent_dir = "../Dataset/Videos/NSL_Consonant_Part_1"
-    # output_parent_dir = "../Dataset/Images_20fr/NSL_Consonant_Part_1"
-
-    # part 3
-    parent_dir = "../Dataset/Videos/NSL_Consonant_Part_1_2"
-    output_parent_dir = "../Dataset/Images_20fr/NSL_Consonant_Part_1_2"
+    # Parent directories containing subdirectories of videos, and where their frames go
+    dir_pairs = [
+        ("../Dataset/Videos/NSL_Vowel", "../Dataset/Images_20fr/NSL_Vowel"),                            # part 1
+        ("../Dataset/Videos/NSL_Consonant_Part_1", "../Dataset/Images_20fr/NSL_Consonant_Part_1"),      # part 2
+        ("../Dataset/Videos/NSL_Consonant_Part_1_2", "../Dataset/Images_20fr/NSL_Consonant_Part_1_2"),  # part 3
+    ]
 
     frame_rate = 20  # Extract 20 frames per second
+    dedup_threshold = None  # e.g. 3 to drop frames nearly identical to the previous saved one
+    resize_mode = "stretch"  # "crop" or "letterbox" keep the aspect ratio of 16:9 videos
+    require_hand = False  # True to skip frames where MediaPipe finds no hand (they end up in hands_not_found later)
 
-    # Loop through each subdirectory in the parent directory
-    for sub_dir in os.listdir(parent_dir):
-        sub_dir_path = os.path.join(parent_dir, sub_dir)
-
-        # Check if it's a directory
-        if os.path.isdir(sub_dir_path):
-            print(f"Processing videos in subdirectory: {sub_dir}")
-
-            # Define the corresponding output subdirectory
-            output_sub_dir = os.path.join(output_parent_dir, sub_dir)
-            # print(f"output_sub_dir={output_sub_dir}")
-            # print(f"sub_dir_path={sub_dir_path}")
-            # Process videos in the current subdirectory
-            process_videos(sub_dir_path, output_sub_dir, frame_rate)
+    process_video_trees(dir_pairs, frame_rate, dedup_threshold=dedup_threshold, resize_mode=resize_mode,
+                        require_hand=require_hand)
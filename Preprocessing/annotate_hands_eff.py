@@ -1,16 +1,87 @@
+import multiprocessing
 import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import cv2
 import mediapipe as mp
 from gesture_mapping import gesture_mapping_vowels, gesture_mapping_consonants
+from Preprocessing.annotation_journal import AnnotationJournal, annotation_report, journal_path
+from Preprocessing.landmark_store import LandmarkStore, handedness_arrays, landmark_store_path
+from Preprocessing.yolo_labels import hand_landmarks_array, landmark_boxes, write_yolo_labels
 
+HANDS_NOT_FOUND_DIR = os.path.join("../Dataset", "hands_not_found_cons_3_train")
+
+
+def create_hands(max_num_hands=1, min_detection_confidence=0.8):
+    """Creates the MediaPipe Hands instance used for annotation."""
+    return mp.solutions.hands.Hands(static_image_mode=True, max_num_hands=max_num_hands,
+                                    min_detection_confidence=min_detection_confidence)
+
+
+def annotation_file(annotation_dir, image_path):
+    """Path of the YOLO label file of an image."""
+    return os.path.join(annotation_dir, os.path.splitext(os.path.basename(image_path))[0] + ".txt")
+
+
+def move_to_hands_not_found(image_path, hands_not_found_dir=HANDS_NOT_FOUND_DIR):
+    """Moves an image in which no hand was detected out of the dataset."""
+    os.makedirs(hands_not_found_dir, exist_ok=True)  # Ensure the directory exists
+    target_path = os.path.join(hands_not_found_dir, os.path.basename(image_path))
+    os.rename(image_path, target_path)  # Move the file
+    print(f"Moved {image_path} to {target_path}")
+
+
+def prefetch_images(image_paths, max_pending=16):
+    """
+    Reads images on a background thread, up to max_pending ahead of the caller. OpenCV releases the GIL while
+    reading and decoding, so the next images are decoded while the caller runs MediaPipe on the current one.
+
+    Args:
+        image_paths (iterable): Paths of the images, in order.
+        max_pending (int): Maximum number of decoded images waiting to be used.
+
+    Yields:
+        tuple: (image_path, image), image being None if it could not be read.
+    """
+    pending = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+
+    def put(item):
+        # Gives up when the caller stopped iterating, instead of blocking on a full queue forever
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def read():
+        for image_path in image_paths:
+            if stop.is_set():
+                break
+            put((image_path, cv2.imread(image_path)))
+        put(None)
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = pending.get()
+            if item is None:
+                break
+            yield item
+    finally:
+        stop.set()
+        reader.join()
 
-def detect_and_annotate(image_path, output_dir, class_id, hands_processor, width, height):
-    """Detect hands in an image and create YOLO-style annotations."""
-    image = cv2.imread(image_path)
-    if image is None:
-        print(f"Error loading {image_path}")
-        return False
 
+def detect_and_annotate(image_path, output_dir, class_id, hands_processor, image,
+                        hands_not_found_dir=HANDS_NOT_FOUND_DIR):
+    """Detect hands in an already decoded image and create YOLO-style annotations."""
+    height, width = image.shape[:2]
     image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
     results = hands_processor.process(image_rgb)
 
@@ -20,80 +91,303 @@ def detect_and_annotate(image_path, output_dir, class_id, hands_processor, width
     #     return False
     if not results.multi_hand_landmarks:
         print(f"No hands detected in {image_path}")
+        move_to_hands_not_found(image_path, hands_not_found_dir)
+        return False
 
-        # Define the target directory for images with no hands detected
-        hands_not_found_dir = os.path.join("../Dataset", "hands_not_found_cons_3_train")
-        os.makedirs(hands_not_found_dir, exist_ok=True)  # Ensure the directory exists
+    annotation_path = annotation_file(output_dir, image_path)
+    landmarks = hand_landmarks_array(results.multi_hand_landmarks)
+    write_yolo_labels(annotation_path, landmark_boxes(landmarks, width, height, class_id))
 
-        # Move the image to the target directory
-        target_path = os.path.join(hands_not_found_dir, os.path.basename(image_path))
-        os.rename(image_path, target_path)  # Move the file
-        print(f"Moved {image_path} to {target_path}")
-        return False
+    return True
 
-    annotation_path = os.path.join(output_dir, os.path.splitext(os.path.basename(image_path))[0] + ".txt")
-    os.makedirs(output_dir, exist_ok=True)
 
-    with open(annotation_path, "w") as f:
-        for hand_landmarks in results.multi_hand_landmarks:
-            offset = 30
-            x_min = max(0, min([lm.x for lm in hand_landmarks.landmark]) * width - offset)
-            y_min = max(0, min([lm.y for lm in hand_landmarks.landmark]) * height - offset)
-            x_max = min(width, max([lm.x for lm in hand_landmarks.landmark]) * width + offset)
-            y_max = min(height, max([lm.y for lm in hand_landmarks.landmark]) * height + offset)
+def annotate_images(input_dir, output_dir, hands_not_found_dir=HANDS_NOT_FOUND_DIR, resume=True):
+    """
+    Annotate all images in a directory with YOLO-style annotations.
 
-            x_center = ((x_min + x_max) / 2) / width
-            y_center = ((y_min + y_max) / 2) / height
-            box_width = (x_max - x_min) / width
-            box_height = (y_max - y_min) / height
+    The status of every image is appended to <output_dir>_journal.jsonl (see annotation_journal.py), and with resume
+    the images annotated by an earlier, interrupted run are skipped.
+    """
+    mp_hands = mp.solutions.hands
+    hands = mp_hands.Hands(static_image_mode=True, max_num_hands=1, min_detection_confidence=0.8)
 
-            f.write(f"{class_id} {x_center:.6f} {y_center:.6f} {box_width:.6f} {box_height:.6f}\n")
+    jobs = collect_annotation_jobs(input_dir, output_dir, hands_not_found_dir, gesture_mapping_consonants)
+    # jobs = collect_annotation_jobs(input_dir, output_dir, hands_not_found_dir, gesture_mapping_vowels)
+    journal = AnnotationJournal(journal_path(output_dir))
+    if resume:
+        jobs = pending_annotation_jobs(jobs, journal)
+    for output_class_dir in {job[1] for job in jobs}:
+        os.makedirs(output_class_dir, exist_ok=True)
 
-    return True
+    # Each image is decoded once, on the reader thread, and the array is passed on
+    images = prefetch_images(job[0] for job in jobs)
+    with journal:
+        for i, ((image_path, output_class_dir, class_id, _, image_id), (_, image)) in enumerate(zip(jobs, images)):
+            if image is None:
+                print(f"Error loading {image_path}")
+                journal.record(image_id, "unreadable", 0)
+                continue
 
+            start = time.perf_counter()
+            annotated = detect_and_annotate(image_path, output_class_dir, class_id, hands, image, hands_not_found_dir)
+            # max_num_hands is 1, an annotated image has one hand
+            journal.record(image_id, "annotated" if annotated else "no_hand", time.perf_counter() - start,
+                           int(annotated))
+            if i % 32 == 31:
+                journal.flush()
 
-def annotate_images(input_dir, output_dir):
-    """Annotate all images in a directory with YOLO-style annotations."""
-    mp_hands = mp.solutions.hands
-    hands = mp_hands.Hands(static_image_mode=True, max_num_hands=1, min_detection_confidence=0.8)
+    hands.close()
 
-    for sub_dir in os.listdir(input_dir):
-        sub_dir_path = os.path.join(input_dir, sub_dir)
 
+def collect_annotation_jobs(input_dir, output_dir, hands_not_found_dir, gesture_mapping=gesture_mapping_consonants):
+    """
+    Lists the images of the class subdirectories of input_dir.
+
+    Args:
+        input_dir (str): Directory with one subdirectory of images per gesture.
+        output_dir (str): Directory the annotations go to, in the same subdirectories.
+        hands_not_found_dir (str): Directory the images without a detected hand are moved to.
+        gesture_mapping (dict): Gesture name -> class ID, subdirectories not in it are skipped.
+
+    Returns:
+        list: (image_path, annotation_dir, class_id, hands_not_found_dir, image_id) tuples, image_id being the path
+            relative to input_dir with "/" separators (the key of the image in the landmark store).
+    """
+    jobs = []
+    for sub_dir in sorted(os.listdir(input_dir)):
+        sub_dir_path = os.path.join(input_dir, sub_dir)
         if not os.path.isdir(sub_dir_path):
             continue
-        print(f"Annotating {sub_dir}")
-        # class_id = gesture_mapping_vowels.get(sub_dir)
-        class_id = gesture_mapping_consonants.get(sub_dir)
+
+        class_id = gesture_mapping.get(sub_dir)
         if class_id is None:
             print(f"Warning: Gesture '{sub_dir}' not found in mapping. Skipping.")
             continue
 
         output_class_dir = os.path.join(output_dir, sub_dir)
-        os.makedirs(output_class_dir, exist_ok=True)
+        image_files = sorted(f for f in os.listdir(sub_dir_path) if f.lower().endswith(('.jpg', '.png', '.jpeg')))
+        jobs.extend((os.path.join(sub_dir_path, image_file), output_class_dir, class_id, hands_not_found_dir,
+                     f"{sub_dir}/{image_file}") for image_file in image_files)
+    return jobs
 
-        image_files = [f for f in os.listdir(sub_dir_path) if f.lower().endswith(('.jpg', '.png', '.jpeg'))]
-        for image_file in image_files:
-            image_path = os.path.join(sub_dir_path, image_file)
-            image = cv2.imread(image_path)
 
-            if image is None:
-                continue
+def pending_annotation_jobs(jobs, journal, store=None):
+    """
+    Leaves out the images a previous run already annotated: annotated in the journal, with their label file still
+    there and, if a landmark store is given, their landmarks in it. Images without a hand were moved out of the
+    dataset, the ones listed again were put back and are annotated again, as are unreadable ones.
 
-            height, width = image.shape[:2]
-            detect_and_annotate(image_path, output_class_dir, class_id, hands, width, height)
+    Args:
+        jobs (list): Jobs of collect_annotation_jobs.
+        journal (AnnotationJournal): Journal of their annotations directory.
+        store (LandmarkStore): Landmark store of their split, or None.
 
-    hands.close()
+    Returns:
+        list: The jobs left to do.
+    """
+    pending = [job for job in jobs
+               if not (journal.status(job[4]) == "annotated" and os.path.exists(annotation_file(job[1], job[0]))
+                       and (store is None or job[4] in store))]
+    if len(pending) < len(jobs):
+        print(f"Skipping {len(jobs) - len(pending)} images already annotated (see {journal.path})")
+    return pending
+
+
+# Hands instance of each annotation worker process
+_worker_hands = None
+
+
+def _init_annotate_worker(max_num_hands, min_detection_confidence):
+    """Creates the Hands instance of a worker process and limits OpenCV to one thread per worker."""
+    global _worker_hands
+    cv2.setNumThreads(1)
+    _worker_hands = create_hands(max_num_hands, min_detection_confidence)
+
+
+def _annotate_chunk(jobs):
+    """
+    Runs Hands over a chunk of images in a worker process. Nothing is written, the parent saves the annotations
+    and moves the images.
+
+    Returns:
+        list: (image_path, hands, seconds) per image, hands being (width, height, landmarks, handedness, scores) as
+            LandmarkStore.add takes them (no rows if no hand was detected), None if the image could not be read,
+            and seconds the time spent detecting.
+    """
+    annotated = []
+    for image_path, image in prefetch_images(job[0] for job in jobs):
+        if image is None:
+            annotated.append((image_path, None, 0))
+            continue
+
+        start = time.perf_counter()
+        height, width = image.shape[:2]
+        results = _worker_hands.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        annotated.append((image_path, (width, height, hand_landmarks_array(results.multi_hand_landmarks),
+                                       *handedness_arrays(results.multi_handedness)), time.perf_counter() - start))
+    return annotated
+
+
+def _save_chunk_annotations(chunk_jobs, annotated, summary, stores, journals, offset):
+    """
+    Writes the annotations of a chunk returned by _annotate_chunk, adds its landmarks to the landmark store of
+    their split, moves its images without a hand and records them in the journal of their split (stores and
+    journals: one LandmarkStore or None and one AnnotationJournal per job).
+    """
+    for (image_path, annotation_dir, class_id, hands_not_found_dir, image_id), (_, hands, seconds), store, journal \
+            in zip(chunk_jobs, annotated, stores, journals):
+        if hands is None:
+            print(f"Error loading {image_path}")
+            summary["unreadable"] += 1
+            journal.record(image_id, "unreadable", seconds)
+            continue
+
+        if store is not None:
+            store.add(image_id, *hands)
+        width, height, landmarks = hands[:3]
+        labels = landmark_boxes(landmarks, width, height, class_id, offset)
+        if not len(labels):
+            print(f"No hands detected in {image_path}")
+            move_to_hands_not_found(image_path, hands_not_found_dir)
+            summary["no_hand"] += 1
+            journal.record(image_id, "no_hand", seconds)
+        else:
+            write_yolo_labels(annotation_file(annotation_dir, image_path), labels)
+            summary["annotated"] += 1
+            journal.record(image_id, "annotated", seconds, len(labels))
+    # The label files are written before their journal lines, a crash in between only annotates them again
+    for journal in set(journals):
+        journal.flush()
+
+
+def annotate_splits(dataset_dir, splits=("train", "test", "val"), hands_not_found_dir="../Dataset/hands_not_found",
+                    gesture_mapping=gesture_mapping_consonants, workers=None, chunk_size=32, batch_size=4000,
+                    max_num_hands=1, min_detection_confidence=0.8, offset=30, save_landmarks=True, resume=True):
+    """
+    Annotates the splits of a YOLO dataset on a process pool, one Hands instance per worker.
+
+    Workers only run the detection, the parent writes the annotations and moves the images without a hand, so
+    the output is the same as annotate_images whatever the number of workers. The status of every image is
+    appended to the journal of its split, <split>/<split>_annotations_journal.jsonl, as soon as its chunk is done
+    (see annotation_journal.py), so a crashed or interrupted run can be resumed.
+
+    Args:
+        dataset_dir (str): Dataset directory with <split>/<split>_images/<gesture> subdirectories, annotations are
+            saved to <split>/<split>_annotations/<gesture>.
+        splits (tuple): Splits to annotate, missing ones are skipped.
+        hands_not_found_dir (str): Images without a detected hand are moved to <hands_not_found_dir>_<split>.
+        gesture_mapping (dict): Gesture name -> class ID, e.g. gesture_mapping_vowels for vowel datasets.
+        workers (int): Number of worker processes, defaults to the number of cores.
+        chunk_size (int): Number of images sent to a worker at a time.
+        batch_size (int): Number of images annotated by a pool before its workers are replaced by new ones, which
+            caps the memory MediaPipe accumulates over long runs. (The pool's own max_tasks_per_child is not used,
+            it deadlocks on Python 3.11.)
+        max_num_hands (int): max_num_hands of the Hands instances.
+        min_detection_confidence (float): min_detection_confidence of the Hands instances.
+        offset (int): Padding around the landmarks in pixels.
+        save_landmarks (bool): Keep the landmarks, handedness and scores of every image in
+            <split>/<split>_landmarks.npz (see landmark_store.py), so the labels can be written again with another
+            offset or class mapping by landmark_store.reemit_labels without running MediaPipe.
+        resume (bool): Skip the images annotated by an earlier run, see pending_annotation_jobs. Their labels and
+            landmarks are kept.
+
+    Returns:
+        dict: Number of images "annotated", with "no_hand" and "unreadable" in this run, and "skipped" as done
+            by an earlier run.
+    """
+    summary = {"annotated": 0, "no_hand": 0, "unreadable": 0, "skipped": 0}
+    jobs = []
+    job_stores = []
+    job_journals = []
+    stores = []
+    journals = []
+    for split in splits:
+        input_dir = os.path.join(dataset_dir, split, f"{split}_images")
+        if not os.path.isdir(input_dir):
+            print(f"Skipping missing directory: {input_dir}")
+            continue
+        annotations_dir = os.path.join(dataset_dir, split, f"{split}_annotations")
+        split_jobs = collect_annotation_jobs(input_dir, annotations_dir, f"{hands_not_found_dir}_{split}",
+                                             gesture_mapping)
+        store = LandmarkStore(landmark_store_path(dataset_dir, split)) if save_landmarks else None
+        if store is not None:
+            stores.append(store)
+        journal = AnnotationJournal(journal_path(annotations_dir))
+        journals.append(journal)
+        if resume:
+            pending = pending_annotation_jobs(split_jobs, journal, store)
+            summary["skipped"] += len(split_jobs) - len(pending)
+            split_jobs = pending
+        jobs.extend(split_jobs)
+        job_stores.extend([store] * len(split_jobs))
+        job_journals.extend([journal] * len(split_jobs))
+
+    if not jobs:
+        print("No images left to annotate." if summary["skipped"] else "No images found.")
+        return summary
+
+    for annotation_dir in {job[1] for job in jobs}:
+        os.makedirs(annotation_dir, exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    print(f"Annotating {len(jobs)} images of {list(splits)} with {workers} worker(s)")
+
+    done = 0
+    start_time = time.perf_counter()
+    try:
+        for batch_start in range(0, len(jobs), batch_size):
+            batch = jobs[batch_start:batch_start + batch_size]
+            # Spawned, not forked: the workers must not inherit the state of MediaPipe or OpenCV threads of the parent
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_annotate_worker,
+                                           initargs=(max_num_hands, min_detection_confidence),
+                                           mp_context=multiprocessing.get_context("spawn"))
+            try:
+                futures = {executor.submit(_annotate_chunk, batch[i:i + chunk_size]): i
+                           for i in range(0, len(batch), chunk_size)}
+                for future in as_completed(futures):
+                    chunk_start = batch_start + futures[future]
+                    chunk_jobs = jobs[chunk_start:chunk_start + chunk_size]
+                    done += len(chunk_jobs)
+                    try:
+                        _save_chunk_annotations(chunk_jobs, future.result(), summary,
+                                                job_stores[chunk_start:chunk_start + chunk_size],
+                                                job_journals[chunk_start:chunk_start + chunk_size], offset)
+                    except Exception as e:
+                        print(f"Error annotating a chunk of images: {e}")
+                    rate = done / (time.perf_counter() - start_time)
+                    print(f"Annotated {done}/{len(jobs)} images ({rate:.1f} images/sec)")
+            finally:
+                # On Ctrl-C only the chunks being annotated are waited for, the queued ones are dropped
+                executor.shutdown(cancel_futures=True)
+            # Saved after every batch too, so a crash loses the landmarks of one batch at most (those images are
+            # annotated again on resume, see pending_annotation_jobs)
+            for store in stores:
+                store.save()
+    finally:
+        # Also saved when the run is interrupted, with the landmarks of the chunks already done
+        for store in stores:
+            store.save()
+        for journal in journals:
+            journal.close()
+
+    print(f"{summary['annotated']} images annotated, {summary['no_hand']} without a hand, "
+          f"{summary['unreadable']} unreadable, {summary['skipped']} already annotated")
+    return summary
 
 
 if __name__ == "__main__":
     src_dir = "../Dataset/YOLO_Data_prd_ver1_cons_3"
     dest_dir = "../Dataset/YOLO_Data_prd_ver1_cons_3"
-    # Annotate training and testing data
+    # Annotate the train, test and val data on a process pool in one run, the images without a hand of each split
+    # are moved to ../Dataset/hands_not_found_cons_3_<split>
+    # A run stopped by a crash or Ctrl-C continues with the images left when started again
+    annotate_splits(dest_dir, hands_not_found_dir="../Dataset/hands_not_found_cons_3")
 
+    # What was annotated, per split and gesture, and the images still without a label
+    # annotation_report(dest_dir)
 
+    # Serial alternative, one split at a time
     # remember to change folder for hands not found
-    annotate_images(os.path.join(dest_dir, 'train', 'train_images'), os.path.join(dest_dir, 'train', 'train_annotations'))
+    # annotate_images(os.path.join(dest_dir, 'train', 'train_images'), os.path.join(dest_dir, 'train', 'train_annotations'))
     # annotate_images(os.path.join(dest_dir, 'test', 'test_images'), os.path.join(dest_dir, 'test', 'test_annotations'))
     # annotate_images(os.path.join(dest_dir, 'val', 'val_images'), os.path.join(dest_dir, 'val', 'val_annotations'))
-    # test,val  done for ver1cons3 train remaining
\ No newline at end of file
@@ -0,0 +1,166 @@
+# Journal of an annotation run, so an interrupted run (crash, Ctrl-C, shutdown) resumes where it stopped instead of
+# annotating everything again, and a report of what was annotated instead of comparing folders with missing_file.
+# Each split has an append-only <split>/<split>_annotations_journal.jsonl, one json line per image with its status
+# (annotated, no_hand or unreadable), the time it took and when. The last line of an image wins.
+
+import json
+import os
+import time
+
+JOURNAL_SUFFIX = "_journal.jsonl"
+STATUSES = ("annotated", "no_hand", "unreadable")
+
+
+def journal_path(annotations_dir):
+    """Path of the journal of an annotations directory, e.g. train/train_annotations_journal.jsonl."""
+    return os.path.normpath(annotations_dir) + JOURNAL_SUFFIX
+
+
+class AnnotationJournal:
+    """
+    Append-only status journal of the images of an annotations directory.
+
+    Args:
+        path (str): Journal file, read if it exists. A line cut short by a crash is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}  # image id -> last entry
+        self._file = None
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[entry["image"]] = entry
+
+    def status(self, image_id):
+        """Last status of an image, None if it was never processed."""
+        entry = self.entries.get(image_id)
+        return entry["status"] if entry else None
+
+    def record(self, image_id, status, seconds, hands=0):
+        """
+        Appends the result of an image to the journal.
+
+        Args:
+            image_id (str): Image path relative to the images directory, e.g. "KA/0.jpg".
+            status (str): One of STATUSES.
+            seconds (float): Time spent reading and annotating the image.
+            hands (int): Number of hands found.
+        """
+        if status not in STATUSES:
+            raise ValueError(f"Unknown status '{status}', expected one of {STATUSES}")
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            cut_short = self._cut_short()
+            self._file = open(self.path, "a")
+            if cut_short:
+                self._file.write("\n")
+
+        entry = {"image": image_id, "status": status, "seconds": round(seconds, 4), "hands": int(hands),
+                 "time": round(time.time(), 3)}
+        self._file.write(json.dumps(entry) + "\n")
+        self.entries[image_id] = entry
+
+    def _cut_short(self):
+        """Whether the journal ends with a line cut short by a crash, the next line must not be appended to it."""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return False
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def flush(self):
+        """Makes the lines recorded so far survive a crash."""
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def annotation_report(dataset_dir, splits=("train", "test", "val"), show_missing=20):
+    """
+    Prints, per split and gesture, the images, labels and journal statuses, and the images still without a label
+    (not annotated yet or failed) and labels without an image.
+
+    Args:
+        dataset_dir (str): Dataset directory with <split>/<split>_images/<gesture> and
+            <split>/<split>_annotations/<gesture> subdirectories.
+        splits (tuple): Splits to report, missing ones are skipped.
+        show_missing (int): Maximum number of names printed per list.
+
+    Returns:
+        dict: split -> gesture -> {"images", "labels", "annotated", "no_hand", "unreadable", "missing_labels",
+            "missing_images", "seconds"}, the counts of files and journal statuses, the names of the images without
+            a label and of the labels without an image, and the time recorded in the journal.
+    """
+    report = {}
+    for split in splits:
+        images_dir = os.path.join(dataset_dir, split, f"{split}_images")
+        annotations_dir = os.path.join(dataset_dir, split, f"{split}_annotations")
+        if not os.path.isdir(images_dir):
+            print(f"Skipping missing directory: {images_dir}")
+            continue
+
+        journal = AnnotationJournal(journal_path(annotations_dir))
+        gestures = {name for name in os.listdir(images_dir) if os.path.isdir(os.path.join(images_dir, name))}
+        if os.path.isdir(annotations_dir):
+            gestures |= {name for name in os.listdir(annotations_dir)
+                         if os.path.isdir(os.path.join(annotations_dir, name))}
+
+        gesture_entries = {}
+        for image_id, entry in journal.entries.items():
+            gesture_entries.setdefault(image_id.split("/")[0], []).append(entry)
+
+        split_report = report[split] = {}
+        print(f"{split}:")
+        print(f"  {'gesture':<10} {'images':>7} {'labels':>7} {'annotated':>9} {'no_hand':>7} {'unreadable':>10} "
+              f"{'missing':>7} {'ms/image':>8}")
+        for gesture in sorted(gestures):
+            image_dir = os.path.join(images_dir, gesture)
+            label_dir = os.path.join(annotations_dir, gesture)
+            images = {os.path.splitext(f)[0]: f for f in os.listdir(image_dir)
+                      if f.lower().endswith(('.jpg', '.png', '.jpeg'))} if os.path.isdir(image_dir) else {}
+            labels = {os.path.splitext(f)[0] for f in os.listdir(label_dir)
+                      if f.endswith(".txt")} if os.path.isdir(label_dir) else set()
+
+            entries = gesture_entries.get(gesture, [])
+            counts = {status: sum(entry["status"] == status for entry in entries) for status in STATUSES}
+            seconds = sum(entry["seconds"] for entry in entries)
+            gesture_report = split_report[gesture] = {
+                "images": len(images), "labels": len(labels), **counts,
+                "missing_labels": sorted(images[name] for name in set(images) - labels),
+                "missing_images": sorted(f"{name}.txt" for name in labels - set(images)),
+                "seconds": seconds}
+            print(f"  {gesture:<10} {len(images):>7} {len(labels):>7} {counts['annotated']:>9} "
+                  f"{counts['no_hand']:>7} {counts['unreadable']:>10} {len(gesture_report['missing_labels']):>7} "
+                  f"{1000 * seconds / max(len(entries), 1):>8.1f}")
+
+        for gesture, gesture_report in sorted(split_report.items()):
+            for key, description in (("missing_labels", "images without a label"),
+                                     ("missing_images", "labels without an image")):
+                names = gesture_report[key]
+                if names:
+                    shown = ", ".join(names[:show_missing]) + (", ..." if len(names) > show_missing else "")
+                    print(f"  {gesture}: {len(names)} {description}: {shown}")
+    return report
+
+
+if __name__ == "__main__":
+    # Example usage: what is left to annotate after an interrupted annotate_hands_eff run
+    annotation_report("../Dataset/YOLO_Data_prd_ver1_cons_3")
@@ -1,4 +1,7 @@
-import shutil
+import hashlib
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import mediapipe as mp
 import cv2
 import numpy as np
@@ -6,39 +9,57 @@ import random
 import os
 
 from gesture_mapping import gesture_mapping_consonants, gesture_mapping_vowels
+from Preprocessing.augmentation_manifest import AugmentationCache
+from Preprocessing.file_storage import store_file
+from Preprocessing.yolo_labels import read_yolo_labels, write_yolo_labels, transform_yolo_boxes
 
+# Output buffers of the background transform reused by augment_file across images, one set per process
+_output_buffers = {}
 
-def random_rotate(image, angle_range=(-25, 25)):
-    """Randomly rotate the image."""
+def affine_matrix(width, height, angle=0.0, scale=1.0):
+    """Matrix rotating by angle degrees and scaling by scale around the image center, for cv2.warpAffine."""
+    return cv2.getRotationMatrix2D((width // 2, height // 2), angle, scale)
+
+
+def warp_image(image, matrix):
+    """Applies an affine matrix to the image, keeping its size and reflecting the borders."""
     height, width = image.shape[:2]
-    angle = random.uniform(*angle_range)
-    matrix = cv2.getRotationMatrix2D((width // 2, height // 2), angle, 1)
     return cv2.warpAffine(image, matrix, (width, height), borderMode=cv2.BORDER_REFLECT)
 
 
+def random_rotate(image, angle_range=(-25, 25), return_matrix=False):
+    """Randomly rotate the image, also returns the affine matrix used if return_matrix is True."""
+    height, width = image.shape[:2]
+    angle = random.uniform(*angle_range)
+    matrix = affine_matrix(width, height, angle=angle)
+    rotated = warp_image(image, matrix)
+    return (rotated, matrix) if return_matrix else rotated
+
+
+def brightness_contrast_lut(brightness, contrast):
+    """Lookup table of cv2.convertScaleAbs(image, alpha=contrast, beta=int(brightness * 50)), for cv2.LUT."""
+    values = np.abs(np.arange(256, dtype=np.float32) * contrast + int(brightness * 50))
+    return np.clip(np.rint(values), 0, 255).astype(np.uint8)
+
+
 def adjust_brightness_contrast(image, brightness_range=(0.75, 1.25), contrast_range=(0.8, 1.2)):
     """Adjust brightness and contrast of the image."""
     brightness = random.uniform(*brightness_range)
     contrast = random.uniform(*contrast_range)
-    return cv2.convertScaleAbs(image, alpha=contrast, beta=int(brightness * 50))
+    return cv2.LUT(image, brightness_contrast_lut(brightness, contrast))
 
 
-def random_scale(image, scale_range=(0.65, 1.35)):
-    """Randomly scale the image."""
+def random_scale(image, scale_range=(0.65, 1.35), return_matrix=False):
+    """
+    Randomly scale the image around its center, keeping its size: zooming in crops the borders, zooming out
+    fills them with a reflection of the image. Done with one warpAffine instead of a resize then a crop or pad.
+    Also returns the affine matrix used if return_matrix is True.
+    """
     height, width = image.shape[:2]
     scale = random.uniform(*scale_range)
-    new_width = int(width * scale)
-    new_height = int(height * scale)
-    scaled_image = cv2.resize(image, (new_width, new_height))
-
-    if scale > 1:
-        start_x = (new_width - width) // 2
-        start_y = (new_height - height) // 2
-        return scaled_image[start_y:start_y + height, start_x:start_x + width]
-    else:
-        pad_x = (width - new_width) // 2
-        pad_y = (height - new_height) // 2
-        return cv2.copyMakeBorder(scaled_image, pad_y, pad_y, pad_x, pad_x, cv2.BORDER_REFLECT)
+    matrix = affine_matrix(width, height, scale=scale)
+    scaled = warp_image(image, matrix)
+    return (scaled, matrix) if return_matrix else scaled
 
 
 def add_gaussian_blur(image, blur_limit=(1, 4)):
@@ -50,135 +71,627 @@ def change_background_color(image, color_range=((0, 0, 0), (255, 255, 255))):
     """Change background color randomly."""
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
-    # Create a binary mask: Background pixels = 255, Foreground pixels = 0
+    # Create a binary mask: Background pixels = 0, Foreground pixels = 255
     _, mask = cv2.threshold(gray, 10, 255, cv2.THRESH_BINARY)
 
-    # Invert the mask: Background pixels = 0, Foreground pixels = 255
-    inverted_mask = cv2.bitwise_not(mask)
-
     # Generate a random background color
     background_color = tuple(random.randint(low, high) for low, high in zip(color_range[0], color_range[1]))
 
-    # Create a solid color background image
-    background = np.full_like(image, background_color)
+    # Fill the output with the color and copy the foreground over it, the output is the only full size allocation
+    final_image = np.empty_like(image)
+    final_image[:] = background_color
+    cv2.copyTo(image, mask, final_image)
+    return final_image
 
-    # Combine the original foreground with the new background
-    foreground = cv2.bitwise_and(image, image, mask=mask)  # Retain only the foreground
-    updated_background = cv2.bitwise_and(background, background, mask=inverted_mask)  # Apply the new background
 
-    # Merge the foreground and the new background
-    final_image = cv2.add(foreground, updated_background)
+def segmentation_mask(image, segmenter, soft=False):
+    """
+    Foreground mask of the image from Mediapipe Selfie Segmentation, computed once per image and shared by
+    every variant that needs it.
 
-    return final_image
+    Args:
+        image (numpy.ndarray): Input image (BGR).
+        segmenter: Selfie Segmentation instance from create_segmenter.
+        soft (bool): Return the foreground probability instead of a thresholded mask, for smoother edges.
+
+    Returns:
+        numpy.ndarray: uint8 mask, foreground = 255, background = 0, or float32 probabilities (0-1) if soft.
+    """
+    # Convert the image to RGB (required by Mediapipe)
+    results = segmenter.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    if soft:
+        return results.segmentation_mask.astype(np.float32)
+    # Threshold the mask to create a binary foreground-background mask
+    return (results.segmentation_mask > 0.5).astype(np.uint8) * 255
+
+
+class BackgroundPool:
+    """
+    Background images loaded once and handed out at random, as an alternative to a solid background color.
+
+    Args:
+        directory (str): Directory of background images (textures, rooms...), walked recursively.
 
+    Attributes:
+        images (list): The decoded backgrounds, at their original size.
+    """
 
-def change_background_with_mediapipe(image, mp_selfie_segmentation, color_range=((0, 0, 0), (255, 255, 255))):
+    def __init__(self, directory):
+        self.images = []
+        for root, _, files in os.walk(directory):
+            for file in sorted(files):
+                if file.lower().endswith(('.jpg', '.png', '.jpeg')):
+                    background = cv2.imread(os.path.join(root, file))
+                    if background is not None:
+                        self.images.append(background)
+        if not self.images:
+            raise ValueError(f"No background images found in {directory}")
+        self._resized = {}  # (index, width, height) -> background resized to that size
+
+    def random(self, width, height):
+        """Returns a random background at the given size, resized once per size and then reused (do not modify it)."""
+        index = random.randrange(len(self.images))
+        key = (index, width, height)
+        if key not in self._resized:
+            self._resized[key] = cv2.resize(self.images[index], (width, height), interpolation=cv2.INTER_AREA)
+        return self._resized[key]
+
+
+def translucency_lut(background_color, alpha):
+    """Per channel lookup table of alpha * background_color + (1 - alpha) * pixel, as cv2.addWeighted computes it."""
+    values = np.arange(256, dtype=np.float64)[:, None] * (1 - alpha) + np.array(background_color) * alpha
+    return np.clip(np.rint(values), 0, 255).astype(np.uint8).reshape(256, 1, 3)
+
+
+def change_background_with_mediapipe(image, segmenter, color_range=((0, 0, 0), (255, 255, 255)), mask=None,
+                                     backgrounds=None, out=None):
     """
     Change the background color of an image using Mediapipe Selfie Segmentation with random translucency.
 
+    The background is blended straight into the output buffer (a lookup table for a solid color), then the
+    foreground is copied over it through the mask, so only the output image is allocated.
+
     Parameters:
         image (numpy.ndarray): Input image (BGR).
-        mp_selfie_segmentation (module): Mediapipe Selfie Segmentation module.
+        segmenter (mediapipe.solutions.selfie_segmentation.SelfieSegmentation): Segmenter instance, created once
+            and reused for every image (see augment_images), loading the model per image is very slow.
         color_range (tuple): Range of colors for random background ((low_B, low_G, low_R), (high_B, high_G, high_R)).
+        mask (numpy.ndarray): Mask from segmentation_mask if it was already computed for this image, the
+            segmenter is not run again. A soft (float) mask blends the edges instead of cutting them.
+        backgrounds (BackgroundPool): Blend a random background image instead of a solid color.
+        out (numpy.ndarray): Buffer of the same shape and type as image to write the result to, e.g. reused
+            across images. A new array is allocated if None.
 
     Returns:
         numpy.ndarray: Image with the updated translucent background.
     """
-    # Initialize Mediapipe Selfie Segmentation
-    with mp_selfie_segmentation.SelfieSegmentation(model_selection=1) as segmenter:
-        # Convert the image to RGB (required by Mediapipe)
-        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-
-        # Generate the segmentation mask
-        results = segmenter.process(rgb_image)
-        mask = results.segmentation_mask
-
-        # Threshold the mask to create a binary foreground-background mask
-        binary_mask = (mask > 0.5).astype(np.uint8) * 255  # Foreground = 255, Background = 0
+    if mask is None:
+        mask = segmentation_mask(image, segmenter)  # Foreground = 255, Background = 0
+    if out is None:
+        out = np.empty_like(image)
 
+    height, width = image.shape[:2]
+    if backgrounds is not None:
+        background = backgrounds.random(width, height)
+        alpha = random.uniform(0.5, 0.7)
+        cv2.addWeighted(background, alpha, image, 1 - alpha, 0, dst=out)
+    else:
         # Generate a random background color
-
         background_color = tuple(random.randint(low, high) for low, high in zip(color_range[0], color_range[1]))
-        solid_background = np.full_like(image, background_color)
-
         # Generate a random alpha value between 0.5 and 0.7 for translucency
         alpha = random.uniform(0.5, 0.7)
+        cv2.LUT(image, translucency_lut(background_color, alpha), dst=out)
+
+    # Keep the person
+    if mask.dtype == np.uint8:
+        cv2.copyTo(image, mask, out)
+    else:
+        weights = np.clip(mask, 0, 1).astype(np.float32)
+        cv2.blendLinear(image, out, weights, 1 - weights, dst=out)
+    return out
+
+
+def augment_image(image, angle_range=(-25, 25), color_range=((0, 0, 0), (255, 255, 255)),
+                  brightness_range=(0.75, 1.25), contrast_range=(0.8, 1.2), scale_range=(0.65, 1.35),
+                  blur_limit=(1, 4), return_matrix=False):
+    """
+    Apply all augmentations to the image: rotation, background color, brightness/contrast, scale and blur.
+    Also returns the affine matrix of the rotation and scale if return_matrix is True.
+
+    Same random parameters, drawn in the same order, as chaining random_rotate, change_background_color,
+    adjust_brightness_contrast, random_scale and add_gaussian_blur, but fused: the color changes work per pixel so
+    they are applied first as a single lookup table pass, and rotation and scale are composed into one matrix and
+    applied with a single warpAffine.
+    """
+    height, width = image.shape[:2]
+    angle = random.uniform(*angle_range)
+    background_color = [random.randint(low, high) for low, high in zip(color_range[0], color_range[1])]
+    brightness = random.uniform(*brightness_range)
+    contrast = random.uniform(*contrast_range)
+    scale = random.uniform(*scale_range)
+    kernel_size = random.choice(range(blur_limit[0], blur_limit[1] + 1, 2))  # Kernel size must be odd
+
+    # Background = pixels that are almost black, as in change_background_color
+    _, background_mask = cv2.threshold(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), 10, 255, cv2.THRESH_BINARY_INV)
+    lut = brightness_contrast_lut(brightness, contrast)
+    colored = cv2.LUT(image, lut)
+    # Masked scalar operations act as setTo: the background is painted in place, no full size color image
+    cv2.bitwise_and(colored, 0, dst=colored, mask=background_mask)
+    cv2.add(colored, tuple(int(value) for value in lut[background_color]) + (0,), dst=colored, mask=background_mask)
+
+    matrix = affine_matrix(width, height, angle=angle, scale=scale)
+    augmented = cv2.GaussianBlur(warp_image(colored, matrix), (kernel_size, kernel_size), 0)
+    return (augmented, matrix) if return_matrix else augmented
+
+
+def load_policy(policy=None):
+    """
+    Returns the augmentation policy to use.
+
+    Args:
+        policy: An AugmentationPolicy, returned as is, or what AugmentationPolicy accepts: the path of a YAML/JSON
+            policy file or a dict, None for the default augmentation_policy.yaml.
+    """
+    from Preprocessing.augmentation_policy import AugmentationPolicy  # that module imports the transforms above
+    return policy if isinstance(policy, AugmentationPolicy) else AugmentationPolicy(policy)
+
+
+def create_segmenter():
+    """Creates the Selfie Segmentation instance used by change_background_with_mediapipe, close it when done."""
+    return mp.solutions.selfie_segmentation.SelfieSegmentation(model_selection=1)
+
+
+def image_seed(relative_path, seed=0):
+    """
+    Derives the random seed of an image from its path, so its augmentations are the same in every run
+    whatever the order or the worker the image is processed in.
 
-        # Apply translucency to the background
-        translucent_background = cv2.addWeighted(solid_background, alpha, image, 1 - alpha, 0)
+    Args:
+        relative_path (str): Path of the image relative to the input directory.
+        seed (int): Base seed of the run.
 
-        # Apply the masks to combine the foreground with the new background
-        foreground = cv2.bitwise_and(image, image, mask=binary_mask)  # Keep the person
-        inverted_mask = cv2.bitwise_not(binary_mask)  # Invert the mask
-        updated_background = cv2.bitwise_and(translucent_background, translucent_background, mask=inverted_mask)  # New background
+    Returns:
+        int: Seed for the image.
+    """
+    digest = hashlib.md5(f"{seed}:{relative_path.replace(os.sep, '/')}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
 
-        # Combine the foreground and the new translucent background
-        final_image = cv2.add(foreground, updated_background)
-        return final_image
 
+def augment_file(file_path, save_dir, segmenter, seed=None, storage="copy", label_path=None, label_save_dir=None,
+                 policy=None, variants=None):
+    """
+    Copies an image to save_dir and saves its augmented variants next to it, as <name>_<variant>.<ext>.
+
+    Label-aware mode (label_path given): the image is already annotated, its YOLO label is placed in
+    label_save_dir and every variant gets a label moved with the same rotation/scale as the image, so the
+    variants do not need hand detection. A variant whose hand ends up mostly outside the image is not saved.
+
+    Args:
+        file_path (str): Path to the image.
+        save_dir (str): Directory to save the original and its variants.
+        segmenter: Selfie Segmentation instance from create_segmenter, None if the policy does not need it.
+        seed (int): Seed of the random transforms (see image_seed), the global random state is used if None.
+        storage (str): How the original is placed in save_dir: "copy", "hardlink" or "reflink"
+            (see file_storage.py).
+        label_path (str): YOLO label file of the image, for label-aware mode.
+        label_save_dir (str): Directory to save the labels of the original and its variants.
+        policy (AugmentationPolicy): Variants to make, see load_policy. Pass the same instance for every image,
+            it accumulates the timings.
+        variants (list): Only make these variants of the policy (see plan_variant_budget), all if None.
+
+    Returns:
+        str: Path of the first variant saved (the copy of the original if none was), None if the image could
+            not be loaded.
+    """
+    from Preprocessing.augmentation_policy import SourceImage
+    policy = load_policy(policy)
+
+    if variants is not None and not variants:
+        # Nothing to make (class already big enough in budget mode), the image is not even decoded
+        original_save_path = os.path.join(save_dir, os.path.basename(file_path))
+        store_file(file_path, original_save_path, storage)
+        if label_path is not None:
+            store_file(label_path, os.path.join(label_save_dir, os.path.basename(label_path)), storage)
+        return original_save_path
+
+    start_time = time.perf_counter()
+    image = cv2.imread(file_path)
+    policy.record("stages", "decode", time.perf_counter() - start_time)
+
+    if image is None:
+        print(f"Error loading {file_path}")
+        return None
+
+    if seed is not None:
+        random.seed(seed)
+
+    file = os.path.basename(file_path)
+    original_save_path = os.path.join(save_dir, file)
+    store_file(file_path, original_save_path, storage)
+
+    labels = None
+    if label_path is not None:
+        labels = read_yolo_labels(label_path)
+        store_file(label_path, os.path.join(label_save_dir, os.path.basename(label_path)), storage)
+    height, width = image.shape[:2]
 
-def augment_image(image):
-    """Apply all augmentations to the image."""
-    image = random_rotate(image)
-    image = change_background_color(image)
-    image = adjust_brightness_contrast(image)
-    image = random_scale(image)
-    image = add_gaussian_blur(image)
-    return image
+    # Every variant starts from the same decoded image, the segmentation mask is computed once. Variants are
+    # encoded before the next one is made, so their outputs can go to this process's reused buffers
+    source = SourceImage(image, segmenter, _output_buffers)
+    file_name, file_ext = os.path.splitext(file)
+    first_save_path = None
+    for variant in policy.variant_names:
+        if variants is not None and variant not in variants:
+            continue
+        variant_image, matrix = policy.apply(source, variant)
+        save_path = os.path.join(save_dir, f"{file_name}_{variant}{file_ext}")
+
+        if labels is not None:
+            variant_labels = transform_yolo_boxes(labels, matrix, width, height)
+            if len(labels) and not len(variant_labels):
+                print(f"Hand moved out of {save_path}, variant not saved")
+                continue
+            write_yolo_labels(os.path.join(label_save_dir, f"{file_name}_{variant}.txt"), variant_labels)
+
+        # Written under a temporary name and renamed, so a variant hardlinked into a split is replaced, not edited
+        start_time = time.perf_counter()
+        temp_path = os.path.join(save_dir, f"{file_name}_{variant}.tmp{file_ext}")
+        if cv2.imwrite(temp_path, variant_image):
+            os.replace(temp_path, save_path)
+        else:
+            print(f"Error: could not write {save_path}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            continue
+        policy.record("stages", "encode", time.perf_counter() - start_time)
+        first_save_path = first_save_path or save_path
+
+    return first_save_path or original_save_path
+
+
+def collect_image_jobs(input_dir, output_dir, label_dir=None, output_label_dir=None):
+    """
+    Lists the images under input_dir with the directory their augmentations are saved in.
 
+    Args:
+        input_dir (str): Directory containing the images (walked recursively).
+        output_dir (str): Directory the augmentations are saved in, mirroring input_dir.
+        label_dir (str): For label-aware mode, directory of the YOLO labels mirroring input_dir
+            (e.g. train/train_annotations for train/train_images). Images without a label are left out.
+        output_label_dir (str): For label-aware mode, directory the labels are saved in.
 
-def augment_images(input_dir, output_dir):
-    """Apply augmentation to all images in the input directory."""
-    mp_selfie_segmentation = mp.solutions.selfie_segmentation
+    Returns:
+        list: (file_path, save_dir, relative_path, label_path, label_save_dir) tuples, relative_path being
+            relative to input_dir, the label entries None without label_dir.
+    """
+    jobs = []
+    missing_labels = 0
     for root, _, files in os.walk(input_dir):
-        relative_path = os.path.relpath(root, input_dir)
-        save_dir = os.path.join(output_dir, relative_path)
+        relative_dir = os.path.relpath(root, input_dir)
+        save_dir = os.path.join(output_dir, relative_dir)
+        for file in sorted(files):
+            if not file.lower().endswith(('.jpg', '.png', '.jpeg')):
+                continue
+            label_path = label_save_dir = None
+            if label_dir is not None:
+                label_path = os.path.join(label_dir, relative_dir, os.path.splitext(file)[0] + ".txt")
+                label_save_dir = os.path.join(output_label_dir, relative_dir)
+                if not os.path.exists(label_path):
+                    missing_labels += 1
+                    continue
+            jobs.append((os.path.join(root, file), save_dir, os.path.normpath(os.path.join(relative_dir, file)),
+                         label_path, label_save_dir))
+    if missing_labels:
+        print(f"Skipping {missing_labels} images without a label in {label_dir}")
+    return jobs
+
+
+def count_images_per_class(folders):
+    """
+    Counts the images of each class over several dataset folders, walking them like
+    Tester/count_files.count_files_in_folders: every sub folder is a class named after the folder.
+
+    Args:
+        folders (list): Folders with one sub folder per class (e.g. NSL_Consonant_Part_1, NSL_Consonant_combo...).
+
+    Returns:
+        dict: Number of images keyed by class, summed over the folders.
+    """
+    counts = {}
+    for folder_path in folders:
+        if not os.path.isdir(folder_path):
+            print(f"The folder '{folder_path}' does not exist or is not a valid directory.")
+            continue
+        for root, _, files in os.walk(folder_path):
+            # Skip the main folder; process only its subfolders
+            if os.path.normpath(root) == os.path.normpath(folder_path):
+                continue
+            class_name = os.path.basename(root)
+            image_count = sum(1 for file in files if file.lower().endswith(('.jpg', '.png', '.jpeg')))
+            counts[class_name] = counts.get(class_name, 0) + image_count
+    return counts
+
+
+def plan_variant_budget(jobs, variant_names, target_count, class_counts=None, seed=0):
+    """
+    Chooses which variants to make of each image so every class reaches target_count images, originals included.
+
+    Classes already at or above the target get no variants, the others get just the number missing (at most
+    every variant of every image), spread evenly over their images and over the variant types. The class of an
+    image is the name of its folder.
+
+    Args:
+        jobs (list): Jobs from collect_image_jobs.
+        variant_names (list): Variants of the policy.
+        target_count (int): Number of images wanted per class.
+        class_counts (dict): Current number of images per class, e.g. from count_images_per_class over all the
+            folders of the dataset. Defaults to the number of images of the class in jobs.
+        seed (int): Seed choosing which images get one variant more when the budget does not divide evenly.
+
+    Returns:
+        list: Variants to make for each job, in the order of jobs.
+    """
+    jobs_per_class = {}
+    for index, job in enumerate(jobs):
+        jobs_per_class.setdefault(os.path.basename(os.path.dirname(job[0])), []).append(index)
+
+    plan = [[] for _ in jobs]
+    for class_name, indices in sorted(jobs_per_class.items()):
+        current = class_counts.get(class_name, len(indices)) if class_counts is not None else len(indices)
+        needed = min(max(0, target_count - current), len(indices) * len(variant_names))
+        per_image, extra = divmod(needed, len(indices))
+        indices = sorted(indices, key=lambda index: image_seed(jobs[index][2], seed))
+        for rank, index in enumerate(indices):
+            count = per_image + (1 if rank < extra else 0)
+            # Each image starts one variant further in the list, so every variant type is used about as often
+            chosen = {variant_names[(rank + k) % len(variant_names)] for k in range(count)}
+            plan[index] = [variant for variant in variant_names if variant in chosen]
+        print(f"{class_name}: {current} images, target {target_count}, {needed} variants to make")
+    return plan
+
+
+def augmentation_outputs(job, variant_names):
+    """
+    Paths of the files augment_file writes for a job: the original, its variants and their labels.
+
+    Args:
+        job (tuple): Job from collect_image_jobs followed by the variants planned for it (None for every variant).
+        variant_names (list): Variants of the policy.
+    """
+    file_path, save_dir, _, label_path, label_save_dir, variants = job
+    file_name, file_ext = os.path.splitext(os.path.basename(file_path))
+    variants = variant_names if variants is None else variants
+    outputs = [os.path.join(save_dir, os.path.basename(file_path))]
+    outputs += [os.path.join(save_dir, f"{file_name}_{variant}{file_ext}") for variant in variants]
+    if label_path is not None:
+        outputs.append(os.path.join(label_save_dir, os.path.basename(label_path)))
+        outputs += [os.path.join(label_save_dir, f"{file_name}_{variant}.txt") for variant in variants]
+    return outputs
+
+
+def skip_unchanged_jobs(jobs, job_output_dirs, cache, policy, input_dirs):
+    """
+    Leaves out the jobs whose image was already augmented the same way (see augmentation_manifest.py), after
+    removing the outputs of the images that were deleted since the last run.
+
+    Args:
+        jobs (list): Jobs followed by their planned variants, see augmentation_outputs.
+        job_output_dirs (list): Root output directory of each job, where its manifest is.
+        cache (AugmentationCache): Manifests of the run.
+        policy (AugmentationPolicy): Policy of the run.
+        input_dirs (dict): Root output directory -> the input directory its originals are read from.
+
+    Returns:
+        tuple: (jobs, job_output_dirs) left to process.
+    """
+    for output_dir in sorted(set(job_output_dirs)):
+        cache.remove_deleted_sources(output_dir, input_dirs[output_dir])
+
+    remaining = [(job, output_dir) for job, output_dir in zip(jobs, job_output_dirs)
+                 if not cache.is_unchanged(output_dir, job[2], job[0], job[3],
+                                           policy.variant_names if job[5] is None else job[5])]
+    if len(remaining) < len(jobs):
+        print(f"Skipping {len(jobs) - len(remaining)} unchanged images, {len(remaining)} left to augment")
+    return [job for job, _ in remaining], [output_dir for _, output_dir in remaining]
+
+
+def record_augmented_jobs(jobs, job_output_dirs, cache, policy):
+    """Stores the outputs of augmented jobs in their manifests, jobs whose original was not placed are left out."""
+    for job, output_dir in zip(jobs, job_output_dirs):
+        outputs = [path for path in augmentation_outputs(job, policy.variant_names) if os.path.exists(path)]
+        if outputs and outputs[0] == os.path.join(job[1], os.path.basename(job[0])):
+            cache.record(output_dir, job[2], outputs)
+
+
+def augment_images(input_dir, output_dir, segmenter=None, seed=0, storage="copy", label_dir=None,
+                   output_label_dir=None, policy=None, target_count=None, class_counts=None, incremental=True):
+    """
+    Apply augmentation to all images in the input directory.
+
+    Args:
+        input_dir (str): Directory containing the images (walked recursively).
+        output_dir (str): Directory to save the originals and augmented images, mirroring input_dir.
+        segmenter: Selfie Segmentation instance from create_segmenter. Pass one to share it across several
+            calls (e.g. one per letter), otherwise one is created for this call and closed at the end.
+        seed (int): Base seed, each image is augmented with image_seed(its path, seed). None to use the global
+            random state instead.
+        storage (str): How originals are placed in output_dir: "copy", "hardlink" or "reflink"
+            (see file_storage.py).
+        label_dir (str): Label-aware mode, augment annotated images and move their labels along
+            (see collect_image_jobs and augment_file).
+        output_label_dir (str): Directory to save the labels in, for label-aware mode.
+        policy: Variants to make, see load_policy. The time spent per transform is printed at the end.
+        target_count (int): Budget mode, only make enough variants for each class to reach this number of images
+            (see plan_variant_budget). Every variant of every image if None.
+        class_counts (dict): Current number of images per class for budget mode, see count_images_per_class.
+        incremental (bool): Only augment the images that are new or changed since the last run (same policy,
+            seed and budget), and remove the outputs of the images that were deleted, see augmentation_manifest.py.
+    """
+    policy = load_policy(policy)
+    if segmenter is None and policy.needs_segmenter:
+        with create_segmenter() as segmenter:
+            augment_images(input_dir, output_dir, segmenter, seed, storage, label_dir, output_label_dir, policy,
+                           target_count, class_counts, incremental)
+        return
+
+    jobs = collect_image_jobs(input_dir, output_dir, label_dir, output_label_dir)
+    plan = [None] * len(jobs)
+    if target_count is not None:
+        plan = plan_variant_budget(jobs, policy.variant_names, target_count, class_counts, seed or 0)
+    jobs = [job + (variants,) for job, variants in zip(jobs, plan)]
+
+    cache = None
+    if incremental:
+        cache = AugmentationCache(policy.fingerprint(), seed)
+        jobs, _ = skip_unchanged_jobs(jobs, [output_dir] * len(jobs), cache, policy, {output_dir: input_dir})
+
+    for job in jobs:
+        file_path, save_dir, relative_path, label_path, label_save_dir, variants = job
         os.makedirs(save_dir, exist_ok=True)
+        if label_save_dir is not None:
+            os.makedirs(label_save_dir, exist_ok=True)
+        image_seed_value = image_seed(relative_path, seed) if seed is not None else None
+        save_path = augment_file(file_path, save_dir, segmenter, image_seed_value, storage, label_path, label_save_dir,
+                                 policy, variants)
+        if save_path:
+            print(f"Processed and saved: {save_path}")
+        if cache is not None:
+            record_augmented_jobs([job], [output_dir], cache, policy)
 
-        for file in files:
-            if file.lower().endswith(('.jpg', '.png', '.jpeg')):
-                file_path = os.path.join(root, file)
-                image = cv2.imread(file_path)
+    if cache is not None:
+        cache.save()
+    policy.report()
 
-                if image is None:
-                    print(f"Error loading {file_path}")
-                    continue
 
-                original_save_path = os.path.join(save_dir, file)
-                shutil.copy(file_path, original_save_path)
-                print(f"Original image copied to: {original_save_path}")
-
-                augmented_image = augment_image(image)
-                rot_image=random_rotate(image)
-                scale_image=random_scale(image)
-                # bright_image=adjust_brightness_contrast(image)
-                # blur_image = add_gaussian_blur(image)
-                bg_changed_image = change_background_with_mediapipe(image,mp_selfie_segmentation)
-
-                # Save the augmented images
-                file_name, file_ext = os.path.splitext(file)
-                augmented_file_name = f"{file_name}_aug{file_ext}"
-                # blur_file_name = f"{file_name}_blur{file_ext}"
-                bg_changed_file_name = f"{file_name}_bg{file_ext}"
-                rot_file_name = f"{file_name}_rot{file_ext}"
-                scale_file_name = f"{file_name}_sc{file_ext}"
-                # bright_file_name = f"{file_name}_br{file_ext}"
-
-                # Construct the save paths
-                save_path = os.path.join(save_dir, augmented_file_name)
-                # blur_save_path = os.path.join(save_dir, blur_file_name)
-                bg_save_path = os.path.join(save_dir, bg_changed_file_name)
-                rot_save_path = os.path.join(save_dir, rot_file_name)
-                scale_save_path = os.path.join(save_dir, scale_file_name)
-                # br_save_path = os.path.join(save_dir, bright_file_name)
-
-                cv2.imwrite(save_path, augmented_image)
-                # cv2.imwrite(blur_save_path, blur_image)
-                cv2.imwrite(bg_save_path, bg_changed_image)
-                cv2.imwrite(rot_save_path, rot_image)
-                cv2.imwrite(scale_save_path, scale_image)
-                # cv2.imwrite(br_save_path, bright_image)
-                print(f"Processed and saved: {save_path}")
+# State of each augmentation worker process, created once by _init_augment_worker
+_worker_segmenter = None
+_worker_policy = None
+
+
+def _init_augment_worker(policy):
+    """
+    Creates the segmenter of a worker process (if the policy needs it) and limits OpenCV to one thread per worker.
+    The segmenter lives as long as the worker, its resources are freed when the pool shuts the worker down.
+    """
+    global _worker_segmenter, _worker_policy
+    cv2.setNumThreads(1)
+    _worker_policy = policy
+    if policy.needs_segmenter:
+        _worker_segmenter = create_segmenter()
+
+
+def _augment_chunk(jobs, seed, storage):
+    """
+    Augments a chunk of images in a worker process.
+
+    Returns:
+        tuple: (number of images augmented, timings of the chunk to merge into the parent's policy).
+    """
+    count = 0
+    for file_path, save_dir, relative_path, label_path, label_save_dir, variants in jobs:
+        image_seed_value = image_seed(relative_path, seed) if seed is not None else None
+        if augment_file(file_path, save_dir, _worker_segmenter, image_seed_value, storage, label_path, label_save_dir,
+                        _worker_policy, variants):
+            count += 1
+    return count, _worker_policy.reset_timings()
+
+
+def augment_images_parallel(dir_pairs, workers=None, seed=0, chunk_size=32, storage="copy", policy=None,
+                            target_count=None, class_counts=None, incremental=True):
+    """
+    Augments the images of several directories on a process pool.
+
+    Images are sent to the workers in chunks, each worker keeps one segmenter for its whole life and every image
+    is seeded from its path (see image_seed), so the output is identical to augment_images and does not depend on
+    the number of workers.
+
+    Args:
+        dir_pairs (list): (input_dir, output_dir) pairs, as passed to augment_images, or
+            (input_dir, output_dir, label_dir, output_label_dir) tuples for label-aware mode.
+        workers (int): Number of worker processes, defaults to the number of cores.
+        seed (int): Base seed of the run.
+        chunk_size (int): Number of images sent to a worker at a time.
+        storage (str): How originals are placed in the output directories: "copy", "hardlink" or "reflink"
+            (see file_storage.py).
+        policy: Variants to make, see load_policy. The time spent per transform in all workers is printed at the end.
+        target_count (int): Budget mode, only make enough variants for each class to reach this number of images
+            (see plan_variant_budget). Every variant of every image if None.
+        class_counts (dict): Current number of images per class for budget mode, see count_images_per_class.
+        incremental (bool): Only augment the images that are new or changed since the last run (same policy,
+            seed and budget), and remove the outputs of the images that were deleted, see augmentation_manifest.py.
+            Each output directory keeps its own manifest.
+
+    Returns:
+        int: Number of images augmented.
+    """
+    policy = load_policy(policy)
+    jobs = []
+    job_output_dirs = []
+    for dirs in dir_pairs:
+        if not os.path.isdir(dirs[0]):
+            print(f"Skipping missing directory: {dirs[0]}")
+            continue
+        dir_jobs = collect_image_jobs(*dirs)
+        jobs.extend(dir_jobs)
+        job_output_dirs.extend([dirs[1]] * len(dir_jobs))
+
+    if not jobs:
+        print("No images found.")
+        return 0
+
+    plan = [None] * len(jobs)
+    if target_count is not None:
+        plan = plan_variant_budget(jobs, policy.variant_names, target_count, class_counts, seed or 0)
+    jobs = [job + (variants,) for job, variants in zip(jobs, plan)]
+
+    cache = None
+    if incremental:
+        cache = AugmentationCache(policy.fingerprint(), seed)
+        jobs, job_output_dirs = skip_unchanged_jobs(jobs, job_output_dirs, cache, policy,
+                                                    {dirs[1]: dirs[0] for dirs in dir_pairs})
+        if not jobs:
+            cache.save()
+            print("All images are up to date.")
+            return 0
+
+    for save_dir in {job[1] for job in jobs} | {job[4] for job in jobs if job[4] is not None}:
+        os.makedirs(save_dir, exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    print(f"Augmenting {len(jobs)} images into variants {policy.variant_names} with {workers} worker(s)")
+
+    done = 0
+    augmented = 0
+    start_time = time.perf_counter()
+    # Spawned, not forked: a worker forked after MediaPipe ran in the parent inherits its threads in an unusable
+    # state and dies, silently dropping its chunks
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_augment_worker, initargs=(policy,),
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {executor.submit(_augment_chunk, jobs[i:i + chunk_size], seed, storage): i
+                   for i in range(0, len(jobs), chunk_size)}
+        try:
+            for future in as_completed(futures):
+                chunk_start = futures[future]
+                chunk_jobs = jobs[chunk_start:chunk_start + chunk_size]
+                done += len(chunk_jobs)
+                try:
+                    count, timings = future.result()
+                    augmented += count
+                    policy.merge_timings(timings)
+                    if cache is not None:
+                        record_augmented_jobs(chunk_jobs, job_output_dirs[chunk_start:chunk_start + chunk_size], cache,
+                                              policy)
+                except Exception as e:
+                    print(f"Error augmenting a chunk of images: {e}")
+                rate = done / (time.perf_counter() - start_time)
+                print(f"Augmented {done}/{len(jobs)} images ({rate:.1f} images/sec)")
+        finally:
+            # Also saved when the run is interrupted, so the chunks already done are not augmented again
+            if cache is not None:
+                cache.save()
+
+    policy.report()
+    return augmented
 
 
 if __name__ == "__main__":
@@ -186,8 +699,32 @@ if __name__ == "__main__":
     letters = list(gesture_mapping_vowels.keys())
     # letters = list(gesture_mapping_consonants.keys())
 
-    for letter in letters:
-        print(f"Folder for {letter}...")
-        input_dir = f"../Dataset/Images_20_final/NSL_Vowels_combo/{letter}"
-        output_dir = f"../Dataset/augmented_images2/NSL_Vowels_combo/{letter}"
-        augment_images(input_dir, output_dir)
+    dir_pairs = [(f"../Dataset/Images_20_final/NSL_Vowels_combo/{letter}",
+                  f"../Dataset/augmented_images2/NSL_Vowels_combo/{letter}") for letter in letters]
+
+    # All letters on a process pool, each worker loads the segmentation model once.
+    # Originals are hardlinked into the output instead of copied (copied anyway across drives)
+    # The variants are listed in augmentation_policy.yaml, pass policy="my_policy.yaml" to use another policy
+    augment_images_parallel(dir_pairs, storage="hardlink")
+
+    # Budget alternative: only make the variants needed for every letter to reach 2000 images, counting the images
+    # each letter already has over all the sources (letters with enough images are only copied)
+    # class_counts = count_images_per_class(["../Dataset/Images_20_final/NSL_Vowels",
+    #                                        "../Dataset/Images_20_final/NSL_Vowels_combo",
+    #                                        "../Dataset/Images_20_final/vowels"])
+    # augment_images_parallel(dir_pairs, storage="hardlink", target_count=2000, class_counts=class_counts)
+
+    # Label-aware alternative: augment after train_test_val_split and annotate_hands_eff instead, the variants get
+    # their labels from the original's label and are not annotated again
+    # yolo_dir = "../Dataset/YOLO_Data_prd_ver1_cons_3"
+    # augmented_yolo_dir = "../Dataset/YOLO_Data_prd_ver1_cons_3_aug"
+    # dir_pairs = [(os.path.join(yolo_dir, "train", "train_images"), os.path.join(augmented_yolo_dir, "train", "train_images"),
+    #               os.path.join(yolo_dir, "train", "train_annotations"),
+    #               os.path.join(augmented_yolo_dir, "train", "train_annotations"))]
+    # augment_images_parallel(dir_pairs, storage="hardlink")
+
+    # Serial alternative, gives the same images
+    # with create_segmenter() as segmenter:
+    #     for input_dir, output_dir in dir_pairs:
+    #         print(f"Folder for {input_dir}...")
+    #         augment_images(input_dir, output_dir, segmenter)
@@ -0,0 +1,169 @@
+# Cache of the images already augmented into an output directory, used by augment_images to only process new or
+# changed originals on a re-run and to remove the variants of originals that were deleted.
+# The manifest is a json file at the root of the output directory, keyed by the image path relative to the input
+# directory. An image is skipped when its content, its label, the policy, the seed and the planned variants are the
+# same as when its outputs were written, and the outputs still exist.
+
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = "augmentation_manifest.json"
+
+
+def load_manifest(output_dir):
+    """
+    Loads the manifest of an output directory.
+
+    Returns:
+        dict: Manifest entries keyed by image path, empty if there is no manifest yet.
+    """
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+
+    try:
+        with open(manifest_path, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Warning: ignoring unreadable manifest {manifest_path}: {e}")
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    """Writes the manifest of an output directory, replacing the old one atomically."""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w") as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+
+def file_digest(path, previous=None):
+    """
+    Hashes the content of a file.
+
+    Args:
+        path (str): File to hash.
+        previous (dict): Manifest entry of the file from the last run, its hash is reused without reading the file
+            if the size and modification time did not change.
+
+    Returns:
+        dict: {"size", "mtime", "sha1"} of the file.
+    """
+    stat = os.stat(path)
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime") == stat.st_mtime:
+        return {"size": stat.st_size, "mtime": stat.st_mtime, "sha1": previous["sha1"]}
+
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return {"size": stat.st_size, "mtime": stat.st_mtime, "sha1": digest.hexdigest()}
+
+
+class AugmentationCache:
+    """
+    Manifests of the output directories of a run.
+
+    Args:
+        policy_fingerprint (str): AugmentationPolicy.fingerprint() of the run.
+        seed (int): Base seed of the run.
+    """
+
+    def __init__(self, policy_fingerprint, seed):
+        self.policy_fingerprint = policy_fingerprint
+        self.seed = seed
+        self.manifests = {}
+        self._pending = {}  # (output_dir, relative_path) -> entry of an image being augmented
+
+    def _manifest(self, output_dir):
+        if output_dir not in self.manifests:
+            self.manifests[output_dir] = load_manifest(output_dir)
+        return self.manifests[output_dir]
+
+    def is_unchanged(self, output_dir, relative_path, file_path, label_path, variants):
+        """
+        Checks whether an image was already augmented the same way, and if not remembers what it is augmented
+        with so record can store it.
+
+        Args:
+            output_dir (str): Root output directory of the image (where the manifest is).
+            relative_path (str): Path of the image relative to its input directory.
+            file_path (str): Path of the image.
+            label_path (str): Path of its label in label-aware mode, None otherwise.
+            variants (list): Variants that will be made of it.
+
+        Returns:
+            bool: True if the image can be skipped.
+        """
+        entry = self._manifest(output_dir).get(relative_path)
+        image = file_digest(file_path, entry and entry.get("image"))
+        label = file_digest(label_path, entry and entry.get("label")) if label_path else None
+        key = hashlib.md5(json.dumps([image["sha1"], label and label["sha1"], self.policy_fingerprint, self.seed,
+                                      list(variants)]).encode("utf-8")).hexdigest()
+
+        if entry is not None and entry.get("key") == key:
+            recorded = [os.path.normpath(os.path.join(output_dir, path)) for path in entry.get("outputs", [])]
+            if all(os.path.exists(path) for path in recorded):
+                return True
+
+        self._pending[(output_dir, relative_path)] = {
+            "image": image, "label": label, "key": key, "previous_outputs": entry.get("outputs", []) if entry else []}
+        return False
+
+    def record(self, output_dir, relative_path, outputs):
+        """
+        Stores the outputs written for an image checked with is_unchanged, and deletes the outputs of its last
+        augmentation that were not written again (e.g. a variant removed from the policy).
+
+        Args:
+            output_dir (str): Root output directory of the image.
+            relative_path (str): Path of the image relative to its input directory.
+            outputs (list): Paths of the files that exist after augmenting it.
+        """
+        entry = self._pending.pop((output_dir, relative_path))
+        relative_outputs = [os.path.relpath(path, output_dir) for path in outputs]
+        for stale in set(entry.pop("previous_outputs")) - set(relative_outputs):
+            stale_path = os.path.join(output_dir, stale)
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+        entry["outputs"] = relative_outputs
+        self._manifest(output_dir)[relative_path] = entry
+
+    def remove_deleted_sources(self, output_dir, input_dir):
+        """
+        Deletes the outputs of the images of a manifest whose original no longer exists. Originals are looked up by
+        their path relative to input_dir, so moving or renaming the input tree, or reaching it from another drive or
+        mount, does not make them look deleted.
+
+        Args:
+            output_dir (str): Root output directory (where the manifest is).
+            input_dir (str): Directory the originals of output_dir are read from. Nothing is removed if it is missing.
+
+        Returns:
+            int: Number of originals whose outputs were removed.
+        """
+        if not os.path.isdir(input_dir):
+            return 0
+
+        manifest = self._manifest(output_dir)
+        removed = 0
+        for relative_path, entry in list(manifest.items()):
+            if os.path.exists(os.path.join(input_dir, relative_path)):
+                continue
+            for path in entry.get("outputs", []):
+                output_path = os.path.join(output_dir, path)
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+            del manifest[relative_path]
+            removed += 1
+        if removed:
+            print(f"Removed the augmentations of {removed} deleted images from {output_dir}")
+        return removed
+
+    def save(self):
+        """Writes every manifest that was loaded."""
+        for output_dir, manifest in self.manifests.items():
+            save_manifest(output_dir, manifest)
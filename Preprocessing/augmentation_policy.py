@@ -0,0 +1,217 @@
+# Declarative augmentation policy: which variants augment_images makes and how, read from a YAML or JSON file
+# (augmentation_policy.yaml by default) instead of being chosen by commenting lines of code.
+# The policy also times every transform and variant, so expensive transforms that do not improve the model can be
+# found and dropped.
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from Preprocessing.augment_images import (augment_image, random_rotate, random_scale, adjust_brightness_contrast,
+                                          add_gaussian_blur, change_background_color,
+                                          change_background_with_mediapipe, segmentation_mask, BackgroundPool)
+
+DEFAULT_POLICY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "augmentation_policy.yaml")
+
+# Part of the policy fingerprint, increase it when a change of the transforms changes the images they make for the
+# same parameters, so cached augmentations are made again (see augmentation_manifest.py)
+TRANSFORMS_VERSION = 1
+
+
+class SourceImage:
+    """
+    The decoded image a set of variants is made from, with its segmentation masks computed on first use and
+    shared by every variant.
+
+    Args:
+        image (numpy.ndarray): The decoded image.
+        segmenter: Selfie Segmentation instance for the background transform.
+        buffers (dict): Output buffers by (shape, dtype) reused across images, e.g. one dict per worker. Only for
+            callers that are done with a variant (encoded it) before making the next one. A new array per
+            variant if None.
+    """
+
+    def __init__(self, image, segmenter=None, buffers=None):
+        self.image = image
+        self.segmenter = segmenter
+        self.buffers = buffers
+        self._masks = {}
+
+    def buffer(self, image):
+        """Reusable output buffer shaped like image, None if the source has no buffers or image is the buffer."""
+        if self.buffers is None:
+            return None
+        out = self.buffers.setdefault((image.shape, image.dtype.str), np.empty_like(image))
+        return None if out is image else out
+
+    def mask(self, image, soft=False):
+        """Segmentation mask of image, cached if image is the source itself (not an already transformed copy)."""
+        if image is not self.image:
+            return segmentation_mask(image, self.segmenter, soft=soft)
+        if soft not in self._masks:
+            self._masks[soft] = segmentation_mask(image, self.segmenter, soft=soft)
+        return self._masks[soft]
+
+
+def _background(image, source, policy, color_range=((0, 0, 0), (255, 255, 255)), soft=False, backgrounds=None):
+    pool = policy.background_pool(backgrounds) if backgrounds else None
+    return change_background_with_mediapipe(image, source.segmenter, color_range, mask=source.mask(image, soft),
+                                            backgrounds=pool, out=source.buffer(image)), None
+
+
+# Transform name -> function(image, source, policy, **params) returning (image, affine matrix or None)
+TRANSFORMS = {
+    "augment": lambda image, source, policy, **params: augment_image(image, return_matrix=True, **params),
+    "rotate": lambda image, source, policy, **params: random_rotate(image, return_matrix=True, **params),
+    "scale": lambda image, source, policy, **params: random_scale(image, return_matrix=True, **params),
+    "brightness_contrast": lambda image, source, policy, **params: (adjust_brightness_contrast(image, **params), None),
+    "blur": lambda image, source, policy, **params: (add_gaussian_blur(image, **params), None),
+    "background_color": lambda image, source, policy, **params: (change_background_color(image, **params), None),
+    "background": _background,
+}
+
+# Transforms that need the segmentation model
+SEGMENTATION_TRANSFORMS = {"background"}
+
+
+def compose_matrices(first, second):
+    """Affine matrix of applying first then second, None standing for no geometric change."""
+    if first is None:
+        return second
+    if second is None:
+        return first
+    return second[:, :2] @ first + np.concatenate([np.zeros((2, 2)), second[:, 2:]], axis=1)
+
+
+def load_policy_config(path):
+    """Reads a policy file, YAML (.yaml/.yml, needs PyYAML) or JSON."""
+    with open(path, "r") as f:
+        if path.lower().endswith((".yaml", ".yml")):
+            import yaml  # only needed for YAML policies
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+class AugmentationPolicy:
+    """
+    Named variants, each a chain of transforms with their parameters, plus the time spent in each.
+
+    Args:
+        config (dict or str): Policy as a dict ({"variants": [{"name", "enabled", "transforms"}]}) or the path
+            of a YAML/JSON policy file. The default file augmentation_policy.yaml if None.
+
+    Attributes:
+        variants (list): (name, [(transform name, params)]) of the enabled variants, in order.
+        timings (dict): {"transforms": {name: [seconds, calls]}, "variants": {...}, "stages": {...}}, stages
+            being the work around the variants (decode, segmentation shared by variants, encode).
+    """
+
+    def __init__(self, config=None):
+        if config is None:
+            config = DEFAULT_POLICY_FILE
+        self.source = config if isinstance(config, str) else "<dict>"
+        if isinstance(config, str):
+            config = load_policy_config(config)
+
+        self.variants = []
+        names = set()
+        for variant in config.get("variants", []):
+            name = variant["name"]
+            if name in names or name == "original":
+                raise ValueError(f"Duplicate or reserved variant name '{name}' in {self.source}")
+            names.add(name)
+            if not variant.get("enabled", True):
+                continue
+            chain = []
+            for step in variant.get("transforms", []):
+                # "- blur" or "- blur: {blur_limit: [1, 4]}"
+                if isinstance(step, str):
+                    transform, params = step, {}
+                else:
+                    (transform, params), = step.items()
+                if transform not in TRANSFORMS:
+                    raise ValueError(f"Unknown transform '{transform}' in variant '{name}' of {self.source}, "
+                                     f"expected one of {sorted(TRANSFORMS)}")
+                chain.append((transform, params or {}))
+            self.variants.append((name, chain))
+
+        self.timings = {"transforms": {}, "variants": {}, "stages": {}}
+        self._background_pools = {}
+
+    @property
+    def variant_names(self):
+        return [name for name, _ in self.variants]
+
+    def fingerprint(self):
+        """Hash of the enabled variants, their transforms and parameters, and TRANSFORMS_VERSION."""
+        description = json.dumps([TRANSFORMS_VERSION, self.variants], sort_keys=True)
+        return hashlib.md5(description.encode("utf-8")).hexdigest()
+
+    @property
+    def needs_segmenter(self):
+        return any(transform in SEGMENTATION_TRANSFORMS for _, chain in self.variants for transform, _ in chain)
+
+    def background_pool(self, directory):
+        """BackgroundPool of a directory, loaded once per policy."""
+        if directory not in self._background_pools:
+            self._background_pools[directory] = BackgroundPool(directory)
+        return self._background_pools[directory]
+
+    def record(self, kind, name, seconds, calls=1):
+        """Adds time to a transform, variant or stage."""
+        entry = self.timings[kind].setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += calls
+
+    def apply(self, source, name):
+        """
+        Makes one variant.
+
+        Args:
+            source (SourceImage): The decoded image.
+            name (str): Variant name, "original" returns the image itself.
+
+        Returns:
+            tuple: (variant image, affine matrix applied to it or None if it was not moved).
+        """
+        if name == "original":
+            return source.image, None
+        chain = dict(self.variants).get(name)
+        if chain is None:
+            raise ValueError(f"Unknown variant '{name}', expected 'original' or one of {self.variant_names}")
+
+        variant_start = time.perf_counter()
+        image, matrix = source.image, None
+        for transform, params in chain:
+            start = time.perf_counter()
+            image, transform_matrix = TRANSFORMS[transform](image, source, self, **params)
+            self.record("transforms", transform, time.perf_counter() - start)
+            matrix = compose_matrices(matrix, transform_matrix)
+        self.record("variants", name, time.perf_counter() - variant_start)
+        return image, matrix
+
+    def merge_timings(self, timings):
+        """Adds timings recorded by another copy of the policy (e.g. in a worker process)."""
+        for kind, entries in timings.items():
+            for name, (seconds, calls) in entries.items():
+                self.record(kind, name, seconds, calls)
+
+    def reset_timings(self):
+        """Clears the timings and returns the previous ones."""
+        timings, self.timings = self.timings, {"transforms": {}, "variants": {}, "stages": {}}
+        return timings
+
+    def report(self):
+        """Prints the time spent per stage, variant and transform, most expensive first."""
+        for kind in ("stages", "variants", "transforms"):
+            entries = self.timings[kind]
+            if not entries:
+                continue
+            total = sum(seconds for seconds, _ in entries.values())
+            print(f"{kind.capitalize()}:")
+            for name, (seconds, calls) in sorted(entries.items(), key=lambda entry: entry[1][0], reverse=True):
+                print(f"  {name:<20} {seconds:8.2f} s  {seconds * 1000 / max(calls, 1):7.2f} ms/call  "
+                      f"{100 * seconds / max(total, 1e-9):5.1f}%")
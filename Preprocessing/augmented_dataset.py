@@ -0,0 +1,216 @@
+# Streaming alternative to step 3.1: instead of writing four augmented copies of every image to disk and uploading
+# them, the training side reads the annotated originals and their YOLO labels and makes the augment_images variants
+# on the fly, with new random transforms every epoch. Only the originals exist on disk.
+# Samples are made by a process pool (one segmenter per worker) a bounded number of chunks ahead of the consumer.
+
+import multiprocessing
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from Preprocessing.augment_images import collect_image_jobs, create_segmenter, image_seed, load_policy
+from Preprocessing.augmentation_policy import SourceImage
+from Preprocessing.yolo_labels import read_yolo_labels, transform_yolo_boxes
+
+# State of each loader worker process, the segmenter is created on first use of a variant that needs it
+_worker_segmenter = None
+_worker_policy = None
+
+
+def _init_loader_worker(policy):
+    """Keeps the policy of a worker process and limits OpenCV to one thread per worker."""
+    global _worker_policy
+    cv2.setNumThreads(1)
+    _worker_policy = policy
+
+
+def load_sample(file_path, label_path, relative_path, variant, seed, epoch, policy, segmenter=None):
+    """
+    Reads an image and its labels and makes one variant of them.
+
+    Args:
+        file_path (str): Path to the image.
+        label_path (str): Path to its YOLO label file.
+        relative_path (str): Path of the image relative to the dataset directory, used for seeding.
+        variant (str): "original" or a variant of the policy.
+        seed (int): Base seed, the transforms of a sample depend on it, its path, variant and epoch only.
+        epoch (int): Epoch number, every epoch gets different transforms.
+        policy (AugmentationPolicy): Policy the variant is defined in.
+        segmenter: Selfie Segmentation instance, for variants that need it.
+
+    Returns:
+        tuple: (image, (n, 5) labels), None if the image could not be read or the hand left the image.
+    """
+    image = cv2.imread(file_path)
+    if image is None:
+        print(f"Error loading {file_path}")
+        return None
+
+    random.seed(image_seed(f"{relative_path}:{variant}:{epoch}", seed))
+    variant_image, matrix = policy.apply(SourceImage(image, segmenter), variant)
+    labels = read_yolo_labels(label_path)
+    height, width = image.shape[:2]
+    variant_labels = transform_yolo_boxes(labels, matrix, width, height)
+    if len(labels) and not len(variant_labels):
+        return None
+    return variant_image, variant_labels
+
+
+def _load_chunk(samples, seed, epoch, policy=None):
+    """
+    Makes a chunk of samples, in a worker process with its policy or in the calling process with the given policy.
+    Returns (name, image, labels) tuples of the usable ones.
+    """
+    global _worker_segmenter
+    policy = policy or _worker_policy
+    loaded = []
+    for file_path, label_path, relative_path, variant in samples:
+        if variant != "original" and policy.needs_segmenter and _worker_segmenter is None:
+            _worker_segmenter = create_segmenter()
+        sample = load_sample(file_path, label_path, relative_path, variant, seed, epoch, policy, _worker_segmenter)
+        if sample is not None:
+            name = os.path.splitext(relative_path)[0] + ("" if variant == "original" else f"_{variant}")
+            loaded.append((name, *sample))
+    return loaded
+
+
+class AugmentedDataset:
+    """
+    Annotated images and their augmented variants, made while iterating.
+
+    Every pass over the dataset yields each image once per variant, in a new shuffled order and with new random
+    transforms, the same ones for the same seed and epoch whatever the number of workers.
+
+    Args:
+        image_dir (str): Directory of the images, e.g. train/train_images (walked recursively).
+        label_dir (str): Directory of their YOLO labels mirroring image_dir, e.g. train/train_annotations.
+            Images without a label are left out.
+        policy: Augmentation policy the variants come from, see augment_images.load_policy.
+        variants (tuple): Variants yielded per image, "original" and/or variants of the policy. Defaults to the
+            original plus every enabled variant of the policy.
+        seed (int): Base seed of the transforms and the shuffling.
+        shuffle (bool): Shuffle the samples every epoch.
+        workers (int): Number of worker processes, defaults to the number of cores. 0 makes the samples in the
+            calling process.
+        prefetch (int): Number of samples made ahead of the consumer.
+        chunk_size (int): Number of samples sent to a worker at a time.
+
+    Example:
+        with AugmentedDataset("train/train_images", "train/train_annotations") as dataset:
+            for epoch in range(epochs):
+                for name, image, labels in dataset.epoch(epoch):
+                    ...
+    """
+
+    def __init__(self, image_dir, label_dir, policy=None, variants=None, seed=0, shuffle=True, workers=None,
+                 prefetch=64, chunk_size=8):
+        self.items = [(file_path, label_path, relative_path) for file_path, _, relative_path, label_path, _
+                      in collect_image_jobs(image_dir, image_dir, label_dir, label_dir)]
+        self.policy = load_policy(policy)
+        self.variants = tuple(variants) if variants is not None else ("original", *self.policy.variant_names)
+        self.seed = seed
+        self.shuffle = shuffle
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.chunk_size = chunk_size
+        self.max_pending = max(1, prefetch // chunk_size)
+        self.next_epoch = 0
+        self._executor = None
+
+    def __len__(self):
+        return len(self.items) * len(self.variants)
+
+    def samples(self, epoch):
+        """Returns the (file_path, label_path, relative_path, variant) samples of an epoch, in order."""
+        samples = [item + (variant,) for item in self.items for variant in self.variants]
+        if self.shuffle:
+            random.Random(image_seed(f"shuffle:{epoch}", self.seed)).shuffle(samples)
+        return samples
+
+    def epoch(self, epoch=None):
+        """
+        Iterates over one epoch.
+
+        Args:
+            epoch (int): Epoch number, defaults to the one after the last epoch iterated.
+
+        Yields:
+            tuple: (name, image, labels), name being the relative path of the image without extension plus the
+                variant suffix (as augment_images would name the file), labels a (n, 5) array of class id,
+                x center, y center, width, height.
+        """
+        if epoch is None:
+            epoch = self.next_epoch
+        self.next_epoch = epoch + 1
+        samples = self.samples(epoch)
+        chunks = [samples[i:i + self.chunk_size] for i in range(0, len(samples), self.chunk_size)]
+
+        start_time = time.perf_counter()
+        count = 0
+        if self.workers == 0:
+            for chunk in chunks:
+                for sample in _load_chunk(chunk, self.seed, epoch, self.policy):
+                    count += 1
+                    yield sample
+        else:
+            if self._executor is None:
+                # Spawned, not forked: the training process usually already runs threads (MediaPipe, torch) that a
+                # forked worker would inherit in an unusable state
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_loader_worker,
+                                                     initargs=(self.policy,),
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            # Chunks are submitted a bounded number ahead and consumed in order, so the order is deterministic
+            pending = deque()
+            chunk_iter = iter(chunks)
+            try:
+                for chunk in chunk_iter:
+                    pending.append(self._executor.submit(_load_chunk, chunk, self.seed, epoch))
+                    if len(pending) >= self.max_pending:
+                        break
+                while pending:
+                    loaded = pending.popleft().result()
+                    next_chunk = next(chunk_iter, None)
+                    if next_chunk is not None:
+                        pending.append(self._executor.submit(_load_chunk, next_chunk, self.seed, epoch))
+                    for sample in loaded:
+                        count += 1
+                        yield sample
+            finally:
+                for future in pending:
+                    future.cancel()
+
+        elapsed = time.perf_counter() - start_time
+        print(f"Epoch {epoch}: {count}/{len(samples)} samples in {elapsed:.1f} seconds "
+              f"({count / max(elapsed, 1e-9):.1f} samples/sec)")
+
+    def __iter__(self):
+        return self.epoch()
+
+    def close(self):
+        """Shuts the worker processes down (and the segmenter of the calling process if workers is 0)."""
+        global _worker_segmenter
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        if self.workers == 0 and _worker_segmenter is not None:
+            _worker_segmenter.close()
+            _worker_segmenter = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+if __name__ == "__main__":
+    # Example usage: one pass over the training split, nothing is written to disk
+    yolo_dir = "../Dataset/YOLO_Data_prd_ver1_cons_3"
+    with AugmentedDataset(os.path.join(yolo_dir, "train", "train_images"),
+                          os.path.join(yolo_dir, "train", "train_annotations")) as dataset:
+        print(f"{len(dataset)} samples per epoch")
+        for name, image, labels in dataset.epoch(0):
+            pass
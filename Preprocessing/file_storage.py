@@ -0,0 +1,89 @@
+# Ways to place an unchanged file in another directory of the dataset, used by augment_images and
+# train_test_val_split instead of always copying it.
+#   copy:     independent copy (shutil.copy), what the scripts always did
+#   hardlink: a second name for the same data, no extra disk space and no data written
+#   reflink:  copy-on-write clone (Btrfs, XFS, APFS...), no extra space until one of the files is modified
+# hardlink and reflink fall back to copy when the filesystem does not support them (e.g. across drives).
+# With hardlinks, editing a file in place changes it everywhere; moving, renaming or deleting one name is safe. The
+# scripts that rewrite dataset files give it a new inode instead of editing the shared one: store_file removes an
+# existing dst before placing the file, augment_images writes variants under a temporary name and renames them, and
+# label writes (write_yolo_labels, reemit_labels, update_class_cons) go through replace_file_text. Other tools
+# editing files in place (an image editor, a labelling tool) still change every linked copy.
+
+import errno
+import os
+import shutil
+import sys
+
+STORAGE_MODES = ("copy", "hardlink", "reflink")
+
+# ioctl request to clone a file on Linux (FICLONE from linux/fs.h)
+_FICLONE = 0x40049409
+
+
+def _reflink(src, dst):
+    """Clones src to dst with copy-on-write, raises OSError if the platform or filesystem cannot."""
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "reflink is only supported on Linux")
+
+    import fcntl  # not available on Windows
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), _FICLONE, src_file.fileno())
+        except OSError:
+            dst_file.close()
+            os.remove(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def store_file(src, dst, mode="copy"):
+    """
+    Places the file src at dst.
+
+    Args:
+        src (str): Path of the existing file.
+        dst (str): Path to create, replaced if it already exists.
+        mode (str): "copy", "hardlink" or "reflink", see the top of this file.
+
+    Returns:
+        str: The mode actually used ("copy" when hardlink or reflink was not possible).
+    """
+    if mode not in STORAGE_MODES:
+        raise ValueError(f"Unknown storage mode '{mode}', expected one of {STORAGE_MODES}")
+
+    if os.path.abspath(src) == os.path.abspath(dst):
+        return mode  # nothing to place, and removing dst would delete the only copy
+    if mode == "hardlink" and os.path.exists(dst) and os.path.samefile(src, dst):
+        return mode  # already linked by a previous run
+    # Never written through: dst may be linked to src or into a split, which would change along with it
+    if os.path.lexists(dst):
+        os.remove(dst)
+
+    if mode != "copy":
+        try:
+            if mode == "hardlink":
+                os.link(src, dst)
+            else:
+                _reflink(src, dst)
+            return mode
+        except OSError:
+            pass  # e.g. another drive or a filesystem without links/clones
+
+    shutil.copy(src, dst)
+    return "copy"
+
+
+def replace_file_text(path, text):
+    """
+    Writes a text file through a temporary file and os.replace, so a file hardlinked by store_file gets a new inode
+    instead of the other names (e.g. the source dataset) changing too, and a crash never leaves half a file.
+
+    Args:
+        path (str): File to write, replaced if it already exists.
+        text (str): New content of the file.
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as file:
+        file.write(text)
+    os.replace(temp_path, path)
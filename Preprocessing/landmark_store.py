@@ -0,0 +1,162 @@
+# Hand landmarks found by annotate_hands_eff, kept next to the YOLO labels so the labels can be derived again with a
+# new box padding or class mapping in seconds (reemit_labels) instead of running MediaPipe over the whole dataset.
+# Each split has one <split>/<split>_landmarks.npz, stored column by column: one row per image (id, size, number of
+# hands) and one row per hand (21 landmarks, handedness and its score). Images without a hand are kept with 0 hands.
+
+import os
+
+import numpy as np
+
+from gesture_mapping import gesture_mapping_vowels, gesture_mapping_consonants
+from Preprocessing.yolo_labels import landmark_boxes, write_yolo_labels
+
+HANDEDNESS = ("Left", "Right")
+
+
+def landmark_store_path(dataset_dir, split):
+    """Path of the landmark store of a split."""
+    return os.path.join(dataset_dir, split, f"{split}_landmarks.npz")
+
+
+def handedness_arrays(multi_handedness):
+    """
+    Converts MediaPipe Hands handedness to arrays.
+
+    Args:
+        multi_handedness: results.multi_handedness of Hands.process, None if no hand was found.
+
+    Returns:
+        tuple: (n_hands,) int8 array of indices into HANDEDNESS and (n_hands,) float32 array of their scores.
+    """
+    classifications = [handedness.classification[0] for handedness in multi_handedness or []]
+    return (np.array([HANDEDNESS.index(c.label) for c in classifications], dtype=np.int8),
+            np.array([c.score for c in classifications], dtype=np.float32))
+
+
+class LandmarkStore:
+    """
+    Landmarks of the images of a split, keyed by image id (path relative to <split>_images, e.g. "KA/0.jpg").
+
+    Args:
+        path (str): .npz file of the store, loaded if it exists.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}  # image id -> (width, height, landmarks, handedness, scores)
+        if os.path.exists(path):
+            self._load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, image_id):
+        return image_id in self.entries
+
+    def add(self, image_id, width, height, landmarks, handedness, scores):
+        """
+        Stores (or replaces) the hands of an image.
+
+        Args:
+            image_id (str): Image path relative to the images directory of the split.
+            width (int): Image width in pixels.
+            height (int): Image height in pixels.
+            landmarks (numpy.ndarray): (n_hands, 21, 3) normalized landmarks, see hand_landmarks_array.
+            handedness (numpy.ndarray): (n_hands,) indices into HANDEDNESS, see handedness_arrays.
+            scores (numpy.ndarray): (n_hands,) handedness scores.
+        """
+        self.entries[image_id] = (width, height, np.asarray(landmarks, dtype=np.float32).reshape(-1, 21, 3),
+                                  np.asarray(handedness, dtype=np.int8), np.asarray(scores, dtype=np.float32))
+
+    def remove(self, image_id):
+        self.entries.pop(image_id, None)
+
+    def _load(self):
+        with np.load(self.path) as data:
+            image_ids, sizes, hand_counts = data["image_ids"], data["image_sizes"], data["hand_counts"]
+            landmarks, handedness, scores = data["landmarks"], data["handedness"], data["scores"]
+        starts = np.concatenate([[0], np.cumsum(hand_counts)])
+        for i, image_id in enumerate(image_ids):
+            hands = slice(starts[i], starts[i + 1])
+            self.entries[str(image_id)] = (int(sizes[i, 0]), int(sizes[i, 1]), landmarks[hands], handedness[hands],
+                                           scores[hands])
+
+    def columns(self):
+        """
+        Returns the store as arrays, images sorted by id.
+
+        Returns:
+            dict: "image_ids" (n_images,), "image_sizes" (n_images, 2) width and height, "hand_counts" (n_images,),
+                and per hand, in image order: "landmarks" (n_hands, 21, 3), "handedness" and "scores" (n_hands,).
+        """
+        image_ids = sorted(self.entries)
+        entries = [self.entries[image_id] for image_id in image_ids]
+        return {
+            "image_ids": np.array(image_ids, dtype=str),
+            "image_sizes": np.array([(width, height) for width, height, *_ in entries], dtype=np.int32).reshape(-1, 2),
+            "hand_counts": np.array([len(entry[2]) for entry in entries], dtype=np.int32),
+            "landmarks": np.concatenate([entry[2] for entry in entries] + [np.zeros((0, 21, 3), np.float32)]),
+            "handedness": np.concatenate([entry[3] for entry in entries] + [np.zeros(0, np.int8)]),
+            "scores": np.concatenate([entry[4] for entry in entries] + [np.zeros(0, np.float32)]),
+        }
+
+    def save(self):
+        """Writes the store, replacing the old file atomically."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp.npz"
+        np.savez(temp_path, **self.columns())
+        os.replace(temp_path, self.path)
+
+
+def reemit_labels(dataset_dir, splits=("train", "test", "val"), offset=30, gesture_mapping=gesture_mapping_consonants):
+    """
+    Writes the YOLO labels of a dataset again from its landmark stores, without running MediaPipe.
+
+    Args:
+        dataset_dir (str): Dataset directory annotated by annotate_hands_eff.annotate_splits.
+        splits (tuple): Splits to write, the ones without a landmark store are skipped.
+        offset (int): Padding around the landmarks in pixels.
+        gesture_mapping (dict): Gesture name (the class subdirectory of the image) -> class ID. Images of gestures
+            not in the mapping are skipped.
+
+    Returns:
+        int: Number of label files written.
+    """
+    written = 0
+    for split in splits:
+        store_path = landmark_store_path(dataset_dir, split)
+        if not os.path.exists(store_path):
+            print(f"Skipping split without landmarks: {store_path}")
+            continue
+
+        columns = LandmarkStore(store_path).columns()
+        hand_counts = columns["hand_counts"]
+        gestures = [image_id.split("/")[0] for image_id in columns["image_ids"]]
+        class_ids = np.array([gesture_mapping.get(gesture, -1) for gesture in gestures])
+        for gesture in sorted({gesture for gesture, class_id in zip(gestures, class_ids) if class_id < 0}):
+            print(f"Warning: Gesture '{gesture}' not found in mapping. Skipping.")
+
+        # The boxes of every hand of the split at once, then cut per image
+        sizes = np.repeat(columns["image_sizes"], hand_counts, axis=0)
+        labels = landmark_boxes(columns["landmarks"], sizes[:, 0], sizes[:, 1], np.repeat(class_ids, hand_counts),
+                                offset)
+        ends = np.cumsum(hand_counts)
+
+        annotations_dir = os.path.join(dataset_dir, split, f"{split}_annotations")
+        split_written = 0
+        for image_id, class_id, count, end in zip(columns["image_ids"], class_ids, hand_counts, ends):
+            if count == 0 or class_id < 0:
+                continue
+            annotation_path = os.path.join(annotations_dir, os.path.splitext(image_id)[0] + ".txt")
+            write_yolo_labels(annotation_path, labels[end - count:end])
+            split_written += 1
+        written += split_written
+        print(f"Wrote {split_written} label files of {split} with offset {offset}")
+    return written
+
+
+if __name__ == "__main__":
+    # Example usage: labels of every split with a padding of 20 pixels instead of 30, no MediaPipe needed
+    yolo_dir = "../Dataset/YOLO_Data_prd_ver1_cons_3"
+    reemit_labels(yolo_dir, offset=20)
+    # reemit_labels(yolo_dir, gesture_mapping=gesture_mapping_vowels)
@@ -1,9 +1,15 @@
 import os
 from sklearn.model_selection import train_test_split
-import shutil
 
-def split_data(src_dir, dest_dir, train_size=0.8, val_size=0.1, test_size=0.1):
-    """Split the dataset into train, validation, and test sets, maintaining class structure."""
+from Preprocessing.file_storage import store_file
+
+def split_data(src_dir, dest_dir, train_size=0.8, val_size=0.1, test_size=0.1, storage="copy"):
+    """
+    Split the dataset into train, validation, and test sets, maintaining class structure.
+
+    storage sets how files are placed in the split directories: "copy", "hardlink" or "reflink"
+    (see file_storage.py), hardlinks avoid storing the dataset twice.
+    """
 
     # Validate that the sum of train_size, val_size, and test_size is 1
     if not abs((train_size + val_size + test_size) - 1.0) < 1e-9:
@@ -36,12 +42,12 @@ def split_data(src_dir, dest_dir, train_size=0.8, val_size=0.1, test_size=0.1):
         # Split remaining files into validation and test sets
         val_files, test_files = train_test_split(remaining_files, train_size=val_size / (val_size + test_size),random_state=42)
 
-        # Copy files into corresponding directories
+        # Copy (or link) files into corresponding directories
         for file_set, save_dir in [(train_files, train_dir), (val_files, val_dir), (test_files, test_dir)]:
             class_save_dir = os.path.join(save_dir, sub_dir)
             os.makedirs(class_save_dir, exist_ok=True)
             for file in file_set:
-                shutil.copy(os.path.join(sub_dir_path, file), os.path.join(class_save_dir, file))
+                store_file(os.path.join(sub_dir_path, file), os.path.join(class_save_dir, file), storage)
 
 
 
@@ -85,6 +91,6 @@ if __name__ == "__main__":
     src_dir = "../Dataset/augmented_images2/NSL_Consonant_Part_1_2"
     dest_dir = "../Dataset/YOLO_Data_prd_ver1_cons_3"
     # Split the data
-    split_data(src_dir, dest_dir, 0.8, 0.1, 0.1)
+    split_data(src_dir, dest_dir, 0.8, 0.1, 0.1, storage="hardlink")
     print("cons2 split done")
 
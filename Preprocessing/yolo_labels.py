@@ -0,0 +1,157 @@
+# YOLO label files (one "class x_center y_center width height" line per hand, coordinates normalized to 0-1), their
+# boxes computed from MediaPipe hand landmarks (shared by the annotation scripts and the testers), and the geometry
+# needed to move labels along with an image, so augmented copies of annotated images get their labels without
+# running hand detection again (see augment_images, label-aware mode).
+
+import os
+
+import numpy as np
+
+from Preprocessing.file_storage import replace_file_text
+
+
+def read_yolo_labels(label_path):
+    """
+    Reads a YOLO label file.
+
+    Returns:
+        numpy.ndarray: (n, 5) float array of class id, x center, y center, width, height.
+    """
+    with open(label_path, "r") as f:
+        rows = [line.split() for line in f if line.strip()]
+    return np.array(rows, dtype=np.float64).reshape(-1, 5)
+
+
+def format_yolo_labels(labels):
+    """Formats (n, 5) labels as returned by read_yolo_labels as the content of a YOLO label file."""
+    return "".join(f"{int(class_id)} {x_center:.6f} {y_center:.6f} {box_width:.6f} {box_height:.6f}\n"
+                   for class_id, x_center, y_center, box_width, box_height in labels)
+
+
+def write_yolo_labels(label_path, labels):
+    """
+    Writes (n, 5) labels as returned by read_yolo_labels to a YOLO label file, in one write. An existing file is
+    replaced, not edited, so its hardlinked copies keep their labels (see file_storage.replace_file_text).
+    """
+    os.makedirs(os.path.dirname(label_path) or ".", exist_ok=True)
+    replace_file_text(label_path, format_yolo_labels(labels))
+
+
+def hand_landmarks_array(multi_hand_landmarks):
+    """
+    Converts MediaPipe Hands landmarks to an array, once per image, so boxes are computed with NumPy instead of
+    looping over the landmark protobufs for every coordinate.
+
+    Args:
+        multi_hand_landmarks: results.multi_hand_landmarks of Hands.process, None if no hand was found.
+
+    Returns:
+        numpy.ndarray: (n_hands, 21, 3) float32 array of normalized x, y, z, with n_hands = 0 if no hand was found.
+    """
+    if not multi_hand_landmarks:
+        return np.zeros((0, 21, 3), dtype=np.float32)
+    return np.array([[(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark]
+                     for hand_landmarks in multi_hand_landmarks], dtype=np.float32)
+
+
+def landmark_boxes(landmarks, width, height, class_ids=0, offset=30):
+    """
+    Computes the YOLO labels of all the hands of an image (or of many images at once) from their landmarks.
+
+    Each box is the bounding box of the 21 landmarks, padded by offset pixels on every side and clipped to the image.
+
+    Args:
+        landmarks (numpy.ndarray): (n_hands, 21, 2 or 3) normalized landmarks, see hand_landmarks_array.
+        width (int or numpy.ndarray): Image width in pixels, or one per hand.
+        height (int or numpy.ndarray): Image height in pixels, or one per hand.
+        class_ids (int or sequence): Class ID of every hand, or one per hand.
+        offset (int): Padding in pixels.
+
+    Returns:
+        numpy.ndarray: (n_hands, 5) labels, as read_yolo_labels returns them.
+    """
+    points = np.asarray(landmarks)[:, :, :2]
+    size = np.stack(np.broadcast_arrays(width, height), axis=-1).astype(np.float64)  # (2,) or (n_hands, 2)
+    # (n_hands, 2) corners, min/max taken before scaling to pixels (the same values, 21 times fewer products)
+    top_left = np.maximum(points.min(axis=1) * size - offset, 0)
+    bottom_right = np.minimum(points.max(axis=1) * size + offset, size)
+
+    labels = np.empty((len(landmarks), 5), dtype=np.float64)
+    labels[:, 0] = class_ids
+    labels[:, 1:3] = (top_left + bottom_right) / 2 / size
+    labels[:, 3:5] = (bottom_right - top_left) / size
+    return labels
+
+
+def yolo_box_corners(labels, width, height):
+    """
+    Converts labels to pixel boxes, e.g. to draw them.
+
+    Returns:
+        numpy.ndarray: (n, 4) float array of x_min, y_min, x_max, y_max.
+    """
+    labels = np.asarray(labels, dtype=np.float64).reshape(-1, 5)
+    x_center, y_center = labels[:, 1] * width, labels[:, 2] * height
+    half_width, half_height = labels[:, 3] * width / 2, labels[:, 4] * height / 2
+    return np.stack([x_center - half_width, y_center - half_height, x_center + half_width, y_center + half_height],
+                    axis=1)
+
+
+def transform_points(points, matrix):
+    """
+    Applies a 2x3 affine matrix (as given to cv2.warpAffine) to points, e.g. hand landmarks in pixels.
+
+    Args:
+        points (numpy.ndarray): (..., 2) array of x, y pixel coordinates.
+        matrix (numpy.ndarray): 2x3 affine matrix.
+
+    Returns:
+        numpy.ndarray: Transformed points, same shape.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    return points @ matrix[:, :2].T + matrix[:, 2]
+
+
+def transform_yolo_boxes(labels, matrix, width, height, min_visibility=0.3):
+    """
+    Moves YOLO boxes along with an image warped by an affine matrix.
+
+    The four corners of each box are transformed and the new box is their bounding box, clipped to the image.
+    Rotated boxes are therefore a bit looser than boxes around rotated landmarks would be.
+
+    Args:
+        labels (numpy.ndarray): (n, 5) labels as returned by read_yolo_labels.
+        matrix (numpy.ndarray): 2x3 affine matrix applied to the image, None for no geometric change.
+        width (int): Image width in pixels (the warp keeps the size).
+        height (int): Image height in pixels.
+        min_visibility (float): Boxes with less than this fraction of their area left inside the image are dropped.
+
+    Returns:
+        numpy.ndarray: (m, 5) transformed labels, m <= n.
+    """
+    if matrix is None or len(labels) == 0:
+        return labels
+
+    x_center, y_center = labels[:, 1] * width, labels[:, 2] * height
+    half_width, half_height = labels[:, 3] * width / 2, labels[:, 4] * height / 2
+    corners = np.stack([
+        np.stack([x_center - half_width, y_center - half_height], axis=1),
+        np.stack([x_center + half_width, y_center - half_height], axis=1),
+        np.stack([x_center + half_width, y_center + half_height], axis=1),
+        np.stack([x_center - half_width, y_center + half_height], axis=1),
+    ], axis=1)  # (n, 4, 2)
+    corners = transform_points(corners, matrix)
+
+    x_min, y_min = corners[..., 0].min(axis=1), corners[..., 1].min(axis=1)
+    x_max, y_max = corners[..., 0].max(axis=1), corners[..., 1].max(axis=1)
+    full_area = (x_max - x_min) * (y_max - y_min)
+
+    x_min, x_max = np.clip(x_min, 0, width), np.clip(x_max, 0, width)
+    y_min, y_max = np.clip(y_min, 0, height), np.clip(y_max, 0, height)
+    visible_area = (x_max - x_min) * (y_max - y_min)
+    keep = visible_area >= min_visibility * np.maximum(full_area, 1e-9)
+
+    transformed = np.stack([labels[:, 0],
+                            (x_min + x_max) / 2 / width, (y_min + y_max) / 2 / height,
+                            (x_max - x_min) / width, (y_max - y_min) / height], axis=1)
+    return transformed[keep]
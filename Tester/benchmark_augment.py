@@ -0,0 +1,188 @@
+import os
+import random
+import time
+import cv2
+import mediapipe as mp
+
+import numpy as np
+
+from Preprocessing.augment_images import (change_background_with_mediapipe, create_segmenter, augment_image,
+                                          add_gaussian_blur, segmentation_mask)
+
+
+def load_sample(input_dir, sample_size=100, seed=42):
+    """Loads a fixed sample of images from a directory tree."""
+    image_paths = []
+    for root, _, files in os.walk(input_dir):
+        image_paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(('.jpg', '.png', '.jpeg')))
+    image_paths.sort()
+    random.Random(seed).shuffle(image_paths)
+
+    images = []
+    for image_path in image_paths[:sample_size]:
+        image = cv2.imread(image_path)
+        if image is not None:
+            images.append(image)
+    return images
+
+
+def benchmark_background_change(images):
+    """
+    Compares background replacement with a segmenter per image (previous behaviour) and one shared segmenter.
+
+    Args:
+        images (list): Decoded sample images.
+
+    Returns:
+        tuple: Images per second (per image segmenter, shared segmenter).
+    """
+    start_time = time.perf_counter()
+    for image in images:
+        with mp.solutions.selfie_segmentation.SelfieSegmentation(model_selection=1) as segmenter:
+            change_background_with_mediapipe(image, segmenter)
+    per_image_rate = len(images) / (time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    with create_segmenter() as segmenter:
+        for image in images:
+            change_background_with_mediapipe(image, segmenter)
+    shared_rate = len(images) / (time.perf_counter() - start_time)
+
+    print(f"{len(images)} images")
+    print(f"Segmenter per image: {per_image_rate:.1f} images/sec")
+    print(f"Shared segmenter:    {shared_rate:.1f} images/sec ({shared_rate / per_image_rate:.1f}x)")
+    return per_image_rate, shared_rate
+
+
+def previous_random_rotate(image, angle_range=(-25, 25)):
+    """random_rotate before the fused augmentation."""
+    height, width = image.shape[:2]
+    angle = random.uniform(*angle_range)
+    matrix = cv2.getRotationMatrix2D((width // 2, height // 2), angle, 1)
+    return cv2.warpAffine(image, matrix, (width, height), borderMode=cv2.BORDER_REFLECT)
+
+
+def previous_change_background_color(image, color_range=((0, 0, 0), (255, 255, 255))):
+    """change_background_color before the fused augmentation (masks and a full size background per image)."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    _, mask = cv2.threshold(gray, 10, 255, cv2.THRESH_BINARY)
+    inverted_mask = cv2.bitwise_not(mask)
+    background_color = tuple(random.randint(low, high) for low, high in zip(color_range[0], color_range[1]))
+    background = np.full_like(image, background_color)
+    foreground = cv2.bitwise_and(image, image, mask=mask)
+    updated_background = cv2.bitwise_and(background, background, mask=inverted_mask)
+    return cv2.add(foreground, updated_background)
+
+
+def previous_adjust_brightness_contrast(image, brightness_range=(0.75, 1.25), contrast_range=(0.8, 1.2)):
+    """adjust_brightness_contrast before the fused augmentation (convertScaleAbs instead of a LUT)."""
+    brightness = random.uniform(*brightness_range)
+    contrast = random.uniform(*contrast_range)
+    return cv2.convertScaleAbs(image, alpha=contrast, beta=int(brightness * 50))
+
+
+def previous_random_scale(image, scale_range=(0.65, 1.35)):
+    """random_scale before the fused augmentation (resize, then crop or pad instead of a centered warpAffine)."""
+    height, width = image.shape[:2]
+    scale = random.uniform(*scale_range)
+    new_width = int(width * scale)
+    new_height = int(height * scale)
+    scaled_image = cv2.resize(image, (new_width, new_height))
+
+    if scale > 1:
+        start_x = (new_width - width) // 2
+        start_y = (new_height - height) // 2
+        return scaled_image[start_y:start_y + height, start_x:start_x + width]
+    else:
+        pad_x = (width - new_width) // 2
+        pad_y = (height - new_height) // 2
+        return cv2.copyMakeBorder(scaled_image, pad_y, pad_y, pad_x, pad_x, cv2.BORDER_REFLECT)
+
+
+def chained_augment_image(image):
+    """The _aug variant as separate transforms, one full image pass each (previous augment_image)."""
+    image = previous_random_rotate(image)
+    image = previous_change_background_color(image)
+    image = previous_adjust_brightness_contrast(image)
+    image = previous_random_scale(image)
+    return add_gaussian_blur(image)
+
+
+def benchmark_fused_augmentation(images, repeats=3):
+    """
+    Compares the chained transforms with the fused augment_image (one LUT pass, one warpAffine).
+
+    Args:
+        images (list): Decoded sample images.
+        repeats (int): Number of passes over the sample.
+
+    Returns:
+        tuple: Milliseconds per image (chained, fused).
+    """
+    timings = []
+    for augment in (chained_augment_image, augment_image):
+        random.seed(0)
+        start_time = time.perf_counter()
+        for _ in range(repeats):
+            for image in images:
+                augment(image)
+        timings.append((time.perf_counter() - start_time) * 1000 / (repeats * len(images)))
+
+    print(f"Chained transforms: {timings[0]:.2f} ms/image")
+    print(f"Fused augment_image: {timings[1]:.2f} ms/image ({timings[0] / timings[1]:.1f}x)")
+    return tuple(timings)
+
+
+def previous_background_compositing(image, binary_mask, color_range=((0, 0, 0), (255, 255, 255))):
+    """Background replacement of change_background_with_mediapipe before compositing in place (6 full size arrays)."""
+    background_color = tuple(random.randint(low, high) for low, high in zip(color_range[0], color_range[1]))
+    solid_background = np.full_like(image, background_color)
+    alpha = random.uniform(0.5, 0.7)
+    translucent_background = cv2.addWeighted(solid_background, alpha, image, 1 - alpha, 0)
+    foreground = cv2.bitwise_and(image, image, mask=binary_mask)
+    inverted_mask = cv2.bitwise_not(binary_mask)
+    updated_background = cv2.bitwise_and(translucent_background, translucent_background, mask=inverted_mask)
+    return cv2.add(foreground, updated_background)
+
+
+def benchmark_background_compositing(images, repeats=3):
+    """
+    Compares the compositing part of the background change (segmentation excluded): previous version, in place
+    with a new output per image, in place into one reused buffer, and with a soft mask.
+
+    Args:
+        images (list): Decoded sample images.
+        repeats (int): Number of passes over the sample.
+
+    Returns:
+        dict: Milliseconds per image keyed by method.
+    """
+    with create_segmenter() as segmenter:
+        masks = [segmentation_mask(image, segmenter) for image in images]
+        soft_masks = [segmentation_mask(image, segmenter, soft=True) for image in images]
+
+    buffers = {}
+    methods = {
+        "previous": lambda image, mask, soft_mask: previous_background_compositing(image, mask),
+        "in place": lambda image, mask, soft_mask: change_background_with_mediapipe(image, None, mask=mask),
+        "reused buffer": lambda image, mask, soft_mask: change_background_with_mediapipe(
+            image, None, mask=mask, out=buffers.setdefault(image.shape, np.empty_like(image))),
+        "soft mask": lambda image, mask, soft_mask: change_background_with_mediapipe(image, None, mask=soft_mask),
+    }
+    timings = {}
+    for name, composite in methods.items():
+        random.seed(0)
+        start_time = time.perf_counter()
+        for _ in range(repeats):
+            for image, mask, soft_mask in zip(images, masks, soft_masks):
+                composite(image, mask, soft_mask)
+        timings[name] = (time.perf_counter() - start_time) * 1000 / (repeats * len(images))
+        print(f"{name:>14}: {timings[name]:.2f} ms/image")
+    return timings
+
+
+# Example usage
+sample = load_sample("../Dataset/Images_20_final/NSL_Vowels_combo", sample_size=100)
+benchmark_background_change(sample)
+benchmark_fused_augmentation(sample)
+benchmark_background_compositing(sample)
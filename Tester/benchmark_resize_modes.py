@@ -0,0 +1,86 @@
+import time
+import cv2
+
+from Image_acquisition.video_to_image import fit_frame, request_decode_size, RESIZE_MODES
+
+INTERPOLATIONS = {
+    "INTER_NEAREST": cv2.INTER_NEAREST,
+    "INTER_LINEAR": cv2.INTER_LINEAR,
+    "INTER_AREA": cv2.INTER_AREA,
+    "INTER_CUBIC": cv2.INTER_CUBIC,
+}
+
+
+def benchmark_resize_modes(video_path, max_frames=200, target_size=(640, 640), repeats=3):
+    """
+    Times every resize mode and interpolation of extract_frames on the first frames of a video.
+
+    The frames are decoded once up front so only the resize is measured.
+
+    Args:
+        video_path (str): Path to the sample video.
+        max_frames (int): Number of frames to decode and resize.
+        target_size (tuple): Size of the saved frames as (width, height).
+        repeats (int): Number of timed passes over the frames, the fastest one is reported.
+
+    Returns:
+        dict: Milliseconds per frame keyed by (resize mode, interpolation name).
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Unable to open video file {video_path}")
+        return {}
+
+    frames = []
+    start_time = time.perf_counter()
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    decode_ms = (time.perf_counter() - start_time) * 1000 / max(len(frames), 1)
+    cap.release()
+
+    if not frames:
+        print(f"No frames could be read from {video_path}")
+        return {}
+
+    height, width = frames[0].shape[:2]
+    print(f"{len(frames)} frames of {width}x{height} from {video_path}, full size decode: {decode_ms:.2f} ms/frame")
+
+    results = {}
+    for resize_mode in RESIZE_MODES:
+        for interpolation_name, interpolation in INTERPOLATIONS.items():
+            best = None
+            for _ in range(repeats):
+                start_time = time.perf_counter()
+                for frame in frames:
+                    fit_frame(frame, target_size, resize_mode, interpolation)
+                elapsed = time.perf_counter() - start_time
+                best = elapsed if best is None else min(best, elapsed)
+
+            results[(resize_mode, interpolation_name)] = best * 1000 / len(frames)
+            print(f"{resize_mode:>10} {interpolation_name:>14}: {results[(resize_mode, interpolation_name)]:.3f} ms/frame")
+
+    # Check whether the backend can decode at a reduced resolution for this video
+    cap = cv2.VideoCapture(video_path)
+    if request_decode_size(cap, target_size):
+        start_time = time.perf_counter()
+        count = 0
+        while count < max_frames:
+            ret, _ = cap.read()
+            if not ret:
+                break
+            count += 1
+        reduced_ms = (time.perf_counter() - start_time) * 1000 / max(count, 1)
+        print(f"Reduced resolution decode: {reduced_ms:.2f} ms/frame")
+    else:
+        print("Reduced resolution decode: not supported by the backend for this video")
+    cap.release()
+
+    return results
+
+
+# Example usage
+video_path = "../Dataset/Videos/NSL_Vowel/S1_NSL_Vowel_Unprepared_Bright/S1_A.mp4"  # any sample video
+benchmark_resize_modes(video_path)
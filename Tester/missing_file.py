@@ -1,3 +1,5 @@
+# For datasets annotated by annotate_hands_eff, Preprocessing/annotation_journal.py (annotation_report) lists the
+# images without a label and the labels without an image for every split and gesture in one run.
 import os
 
 
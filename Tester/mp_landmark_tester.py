@@ -2,6 +2,7 @@ import os
 import cv2
 import mediapipe as mp
 from gesture_mapping import gesture_mapping_vowels
+from Preprocessing.yolo_labels import hand_landmarks_array, landmark_boxes, write_yolo_labels, yolo_box_corners
 
 
 def detect_and_annotate(image_path, output_dir, class_id, hands_processor, width, height):
@@ -37,26 +38,14 @@ def detect_and_annotate(image_path, output_dir, class_id, hands_processor, width
 
     # Annotation file path
     annotation_path = os.path.join(output_dir, os.path.splitext(os.path.basename(image_path))[0] + ".txt")
-    with open(annotation_path, "w") as f:
-        for hand_landmarks in results.multi_hand_landmarks:
-            offset = 30  # Padding for bounding box
-            x_min = max(0, min([lm.x for lm in hand_landmarks.landmark]) * width - offset)
-            y_min = max(0, min([lm.y for lm in hand_landmarks.landmark]) * height - offset)
-            x_max = min(width, max([lm.x for lm in hand_landmarks.landmark]) * width + offset)
-            y_max = min(height, max([lm.y for lm in hand_landmarks.landmark]) * height + offset)
-
-            # YOLO annotation values
-            x_center = ((x_min + x_max) / 2) / width
-            y_center = ((y_min + y_max) / 2) / height
-            box_width = (x_max - x_min) / width
-            box_height = (y_max - y_min) / height
-
-            # Write annotation in YOLO format
-            f.write(f"{class_id} {x_center:.6f} {y_center:.6f} {box_width:.6f} {box_height:.6f}\n")
+    landmarks = hand_landmarks_array(results.multi_hand_landmarks)
+    labels = landmark_boxes(landmarks, width, height, class_id, offset=30)  # Padding for bounding box
+    write_yolo_labels(annotation_path, labels)
 
     # Optional: Draw landmarks and bounding box for visualization
     mp_drawing = mp.solutions.drawing_utils
-    for hand_landmarks in results.multi_hand_landmarks:
+    for hand_landmarks, (x_min, y_min, x_max, y_max) in zip(results.multi_hand_landmarks,
+                                                            yolo_box_corners(labels, width, height)):
         mp_drawing.draw_landmarks(image, hand_landmarks, mp.solutions.hands.HAND_CONNECTIONS)
         cv2.rectangle(image, (int(x_min), int(y_min)), (int(x_max), int(y_max)), (0, 255, 0), 2)
 
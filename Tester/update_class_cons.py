@@ -1,6 +1,8 @@
 import os
 import re
 
+from Preprocessing.file_storage import replace_file_text
+
 # Mapping of gestures to new indices (0-based)
 gesture_mapping_consonants = {
     'KA': 13, 'KHA': 14, 'GA': 15, 'GHA': 16, 'NGA': 17, 'CHA': 18, 'CHHA': 19, 'JA': 20,
@@ -42,9 +44,8 @@ for filename in os.listdir(labels_dir):
 
                 updated_lines.append(" ".join(parts))
 
-        # Write the updated labels back to the file
-        with open(filepath, 'w') as file:
-            file.write("\n".join(updated_lines))
+        # Write the updated labels back to the file, replaced instead of edited so hardlinked copies are not changed
+        replace_file_text(filepath, "\n".join(updated_lines))
 
 print("Class labels have been updated successfully!")
 print(f"{index} files updated successfully!")
\ No newline at end of file
@@ -20,6 +20,7 @@ import warnings
 warnings.simplefilter("ignore", category=FutureWarning)
 
 from gesture_mapping import consonants_mapping, vowels_mapping, consonant_vowel_matrix
+from Image_acquisition.camera_source import CameraSource
 
 os.environ['TORCH_HOME'] = "D:/Programming/FYP_NSL/cache1"
 
@@ -117,8 +118,9 @@ class SignAlphabetApp:
 
     def start_video(self):
         if not self.running:
-            self.cap = cv2.VideoCapture(0)      #if laptop webcam is used
-            # self.cap = cv2.VideoCapture(1)      #if additional webcam is used
+            # frames are grabbed on a background thread, so inference always runs on the newest frame
+            self.cap = CameraSource(0).start()      #if laptop webcam is used
+            # self.cap = CameraSource(1).start()      #if additional webcam is used
             self.running = True
             # self.video_thread = threading.Thread(target=self.update_video_feed)
             # self.video_thread.start()
@@ -139,7 +141,7 @@ class SignAlphabetApp:
 
     def update_video_feed(self):
         if self.running:
-            success, frame = self.cap.read()
+            success, frame = self.cap.read(timeout=0)  # no new frame yet: try again on the next tick
             if success:
                 rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
                 # rgb_frame = cv2.resize(rgb_frame, (640, 640))  # Or (416, 416)
@@ -8,6 +8,7 @@ import mediapipe as mp
 from sklearn.model_selection import train_test_split
 
 from gesture_mapping import gesture_mapping_vowels
+from Preprocessing.yolo_labels import hand_landmarks_array, landmark_boxes, write_yolo_labels
 
 
 def split_data(src_dir, dest_dir, train_size=0.7):
@@ -91,23 +92,9 @@ def detect_and_annotate(image_path, output_dir, class_id=0):
     annotation_path = os.path.join(output_dir, os.path.splitext(image_name)[0] + ".txt")
     os.makedirs(output_dir, exist_ok=True)
 
-    with open(annotation_path, "w") as annotation_file:
-        for hand_landmarks in results.multi_hand_landmarks:
-            offset = 30
-            # Get bounding box from landmarks
-            x_min = max(0, min([lm.x for lm in hand_landmarks.landmark]) * width - offset)
-            y_min = max(0, min([lm.y for lm in hand_landmarks.landmark]) * height - offset)
-            x_max = min(width, max([lm.x for lm in hand_landmarks.landmark]) * width + offset)
-            y_max = min(height, max([lm.y for lm in hand_landmarks.landmark]) * height + offset)
-
-            # Normalize coordinates
-            x_center = ((x_min + x_max) / 2) / width
-            y_center = ((y_min + y_max) / 2) / height
-            box_width = (x_max - x_min) / width
-            box_height = (y_max - y_min) / height
-
-            # Write YOLO annotation
-            annotation_file.write(f"{class_id} {x_center:.6f} {y_center:.6f} {box_width:.6f} {box_height:.6f}\n")
+    # Bounding boxes of all detected hands from their landmarks, padded by 30 pixels
+    landmarks = hand_landmarks_array(results.multi_hand_landmarks)
+    write_yolo_labels(annotation_path, landmark_boxes(landmarks, width, height, class_id, offset=30))
 
     print(f"Annotations saved for {image_name}: {annotation_path}")
 